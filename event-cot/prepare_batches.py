@@ -6,58 +6,128 @@ Ne crée PAS les batchs : chaque lot reste prêt à être lancé.
 """
 
 import json
+import sys
 from pathlib import Path
 from tqdm import tqdm
-import tiktoken
 from openai import OpenAI
 
+# Modules partagés avec le pipeline NER (comptage de tokens, …)
+sys.path.append(str(Path(__file__).resolve().parents[1] / "ner"))
+from token_accounting import get_counter
+from entity_inventory import INVENTORY_SYSTEM_PROMPT, build_inventory_schema, load_inventories
+from select_ambiguous import load_ambiguous_ids
+
 # ── CONFIG ────────────────────────────────────────────────────────────────────
 MODEL = "gpt-4.1"
 TOKEN_LIMIT_PER_BATCH = 1_200_000   # marge
 PROMPT_ROOT_DIR = Path("event-cot/generated_prompts/events")
 OUTPUT_DIR = Path("event-cot/openai_outputs")
 BATCH_INPUT_DIR = OUTPUT_DIR / "batch_inputs"
+ONLY_CHANGED = False                # ne batcher que les prompts listés dans changes.json
+ESTIMATE_ONLY = False               # estimation calibrée (+ marge) au lieu du comptage exact
+
+# Granularité du raisonnement demandé (les explications ne sont pas relues
+# par les scripts de reconstruction, seulement payées en tokens de sortie) :
+#   "none"      → aucune explication (coût du pipeline événements simple)
+#   "event"     → une justification courte par événement (champ "rationales")
+#   "attribute" → une explication par attribut (comportement d'origine)
+COT_GRANULARITY = "attribute"
+MAX_RATIONALE_WORDS = 25          # imposé au décodage par le motif du schéma (RATIONALE_PATTERN)
+
+# Deuxième passe : ne relancer, avec COT_GRANULARITY, que les prompts listés
+# dans <dossier>/ambiguous.json (select_ambiguous.py, sur une 1re passe en
+# "none"). Les réponses s'ajoutent au même <strategy>_outputs.jsonl et
+# remplacent celles de la 1re passe (la dernière réponse d'un id l'emporte).
+SECOND_PASS = False
 
 # ── INIT ─────────────────────────────────────────────────────────────────────
-try:
-    ENCODING = tiktoken.encoding_for_model(MODEL)
-except KeyError:
-    ENCODING = tiktoken.get_encoding("o200k_base")
-
+COUNTER = get_counter(MODEL)
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 BATCH_INPUT_DIR.mkdir(parents=True, exist_ok=True)
 client = OpenAI()
 
 # ── SCHÉMA JSON ──────────────────────────────────────────────────────────────
-EVENT_SCHEMA = {
-    "type": "object",
-    "properties": {
-        "events": {
-            "type": "array",
-            "items": {
+def build_event_schema(granularity: str = COT_GRANULARITY) -> dict:
+    """Schéma événements ; l'explication suit la granularité de raisonnement"""
+    properties = {
+        "attribute": {"type": "string"},
+        "value": {"type": "string"},
+    }
+    if granularity == "attribute":
+        properties["explanation"] = {"type": "string"}  # ✅ Ajouté
+    schema = {
+        "type": "object",
+        "properties": {
+            "events": {
                 "type": "array",
                 "items": {
-                    "type": "object",
-                    "properties": {
-                        "attribute": {"type": "string"},
-                        "value": {"type": "string"},
-                        "explanation": {"type": "string"}  # ✅ Ajouté
-                    },
-                    "required": ["attribute", "value", "explanation"],
-                    "additionalProperties": False
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": properties,
+                        "required": list(properties),
+                        "additionalProperties": False
+                    }
                 }
             }
-        }
-    },
-    "required": ["events"],
-    "additionalProperties": False
+        },
+        "required": ["events"],
+        "additionalProperties": False
+    }
+    return with_rationales(schema) if granularity == "event" else schema
+
+# Au plus MAX_RATIONALE_WORDS mots : le schéma strict contraint la génération,
+# les mots au-delà ne sont donc ni produits ni facturés
+RATIONALE_PATTERN = rf"^\S+(?:\s+\S+){{0,{MAX_RATIONALE_WORDS - 1}}}$"
+
+def with_rationales(schema: dict) -> dict:
+    """Ajoute, avant les événements, une justification courte par événement"""
+    rationale = {"type": "string", "pattern": RATIONALE_PATTERN}
+    return {
+        **schema,
+        "properties": {"rationales": {"type": "array", "items": rationale},
+                       **schema["properties"]},
+        "required": ["rationales"] + schema["required"],
+    }
+
+EVENT_SCHEMA = build_event_schema()
+
+BASE_SYSTEM_PROMPT = "Tu es un assistant d'extraction d'événements. "
+SYSTEM_PROMPTS = {
+    "none": BASE_SYSTEM_PROMPT +
+        "Tu dois retourner un JSON de la forme : "
+        "{\"events\": [[{\"attribute\": ..., \"value\": ...}, ...], ...]}",
+    "event": BASE_SYSTEM_PROMPT +
+        "Tu dois retourner un JSON de la forme : "
+        "{\"rationales\": [...], \"events\": [[{\"attribute\": ..., \"value\": ...}, ...], ...]}. "
+        f"Donne d'abord, pour chaque événement et dans le même ordre, une justification "
+        f"d'au plus {MAX_RATIONALE_WORDS} mots.",
+    "attribute": BASE_SYSTEM_PROMPT +
+        "Ta tâche est d'extraire les événements du texte utilisateur. "
+        "Pour chaque attribut dans un événement, fournis un JSON avec les champs : "
+        "{\"attribute\": ..., \"value\": ..., \"explanation\": ...}. "
+        "L'explication doit décrire pourquoi ce couple attribut/valeur est pertinent.",
+}
+SYSTEM_PROMPT = SYSTEM_PROMPTS[COT_GRANULARITY]
+
+INVENTORY_COT_PROMPTS = {
+    "none": "",
+    "event": f" Donne d'abord dans \"rationales\", pour chaque événement et dans le même "
+             f"ordre, une justification d'au plus {MAX_RATIONALE_WORDS} mots.",
+    "attribute": " Ajoute pour chaque attribut un champ \"explanation\" décrivant pourquoi"
+                 " ce couple attribut/entité est pertinent.",
 }
 
 # ── UTILS ────────────────────────────────────────────────────────────────────
-def count_tokens(text: str) -> int:
-    return len(ENCODING.encode(text))
-
-def build_batch_request(prompt_text: str, prompt_id: str) -> dict:
+def build_batch_request(prompt_text: str, prompt_id: str, handle_ids: list = None) -> dict:
+    """Requête Batch ; en mode inventaire, schéma à enum sur les poignées du document"""
+    schema, system_prompt = EVENT_SCHEMA, SYSTEM_PROMPT
+    if handle_ids is not None:
+        schema = build_inventory_schema(len(handle_ids),
+                                        explanation=COT_GRANULARITY == "attribute")
+        if COT_GRANULARITY == "event":
+            schema = with_rationales(schema)
+        system_prompt = INVENTORY_SYSTEM_PROMPT + INVENTORY_COT_PROMPTS[COT_GRANULARITY]
     return {
         "custom_id": prompt_id,
         "method": "POST",
@@ -65,19 +135,13 @@ def build_batch_request(prompt_text: str, prompt_id: str) -> dict:
         "body": {
             "model": MODEL,
             "input": [
-                {"role": "system",
-                "content": "Tu es un assistant d'extraction d'événements. "
-                        "Ta tâche est d'extraire les événements du texte utilisateur. "
-                        "Pour chaque attribut dans un événement, fournis un JSON avec les champs : "
-                        "{\"attribute\": ..., \"value\": ..., \"explanation\": ...}. "
-                        "L'explication doit décrire pourquoi ce couple attribut/valeur est pertinent."
-                    },
+                {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt_text}
             ],
             "text": {"format": {
                     "type": "json_schema",
                     "name": "event_response",
-                    "schema": EVENT_SCHEMA,
+                    "schema": schema,
                     "strict": True
                 }}
         }
@@ -87,13 +151,30 @@ def build_batch_request(prompt_text: str, prompt_id: str) -> dict:
 def prepare_one_strategy(strategy_dir: Path):
     strategy = strategy_dir.name
     prompts  = sorted(strategy_dir.glob("prompt_*.txt"))
+    changes_path = strategy_dir / "changes.json"
+    if ONLY_CHANGED and changes_path.exists():
+        changed = set(json.loads(changes_path.read_text(encoding="utf-8"))["changed"])
+        prompts = [pf for pf in prompts if pf.stem in changed]
+    if SECOND_PASS:
+        ambiguous = load_ambiguous_ids(strategy_dir)
+        prompts = [pf for pf in prompts if pf.stem in ambiguous]
+    # Mode inventaire : sans entité prédite, aucun événement à relier
+    inventories = load_inventories(strategy_dir)
+    if inventories is not None:
+        n_before = len(prompts)
+        prompts = [pf for pf in prompts if inventories.get(pf.stem)]
+        if len(prompts) < n_before:
+            print(f"⏭️ {n_before - len(prompts)} prompt(s) sans entité ignoré(s)")
     print(f"\n📂 {strategy}: {len(prompts)} prompts trouvés")
+    if not prompts:
+        return
 
     batches, cur_batch, token_sum = [], [], 0
-    for pf in tqdm(prompts, desc=f"Découpage {strategy}"):
-        txt   = pf.read_text(encoding="utf-8")
-        req   = build_batch_request(txt, pf.stem)
-        tokens = count_tokens(txt)
+    counted = COUNTER.iter_counted(((pf.stem, pf.read_text(encoding="utf-8")) for pf in prompts),
+                                   ESTIMATE_ONLY)
+    for prompt_id, txt, tokens in tqdm(counted, total=len(prompts), desc=f"Découpage {strategy}"):
+        req   = build_batch_request(txt, prompt_id,
+                                    inventories[prompt_id] if inventories is not None else None)
         if token_sum + tokens > TOKEN_LIMIT_PER_BATCH:
             batches.append(cur_batch)
             cur_batch, token_sum = [], 0
@@ -105,7 +186,7 @@ def prepare_one_strategy(strategy_dir: Path):
     print(f"🔢 {len(batches)} lot(s) généré(s)")
 
     for idx, lines in enumerate(batches, start=1):
-        batch_name = f"{strategy}_part{idx}"
+        batch_name = f"{strategy}{'_pass2' if SECOND_PASS else ''}_part{idx}"
         jsonl_path = BATCH_INPUT_DIR / f"{batch_name}.jsonl"
 
         # 1. Écriture
@@ -0,0 +1,145 @@
+"""
+Sélection des documents à relancer avec raisonnement (2e passe de
+prepare_batches.py, SECOND_PASS = True).
+
+À partir des sorties d'une 1re passe sans explication, un prompt est jugé
+ambigu si :
+  • la réponse manque ou est en erreur ;
+  • un événement n'a pas exactement un élément central, ou ses éléments
+    associés ne comprennent pas au moins un lieu et une date : labels des
+    entités prédites par le NER (poignées en mode inventaire, texte exact
+    sinon), détecteur de dates de ner/rule_book.py pour une valeur sans
+    entité ; sans prédiction NER pour le document, deux éléments associés
+    suffisent ;
+  • une valeur n'apparaît pas dans le texte du document ;
+  • aucun événement n'est renvoyé alors que le texte mentionne une maladie
+    ou un agent NRBCE (détecteurs de ner/rule_book.py).
+En mode découpé, le texte comparé est celui de la fenêtre (chunks.json).
+Écrit <dossier de prompts>/ambiguous.json : {"ids": [...], "reasons": {id: [...]}}.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "ner"))
+from rule_book import DATE_RE, DISEASE_RE, NRBCE_RE
+from segment_registry import segment_index
+from entity_inventory import inventory_predictions, load_inventories, normalize
+
+# Générateur de prompts commun aux deux pipelines
+sys.path.append(str(Path(__file__).resolve().parents[1] / "event"))
+from generate_event_prompts import CHUNKS_NAME, NER_PREDICTIONS_PATH
+
+# === Paramètres ===
+PROMPT_ROOT_DIR = Path("event-cot/generated_prompts/events")
+RESULTS_DIR = Path("event-cot/batch_results")       # <strategy>_outputs.jsonl de la 1re passe
+TEST_JSON_PATH = Path("datasets/test.json")
+AMBIGUOUS_NAME = "ambiguous.json"
+DATE_LABELS = {"ABS_DATE", "REL_DATE", "DOC_DATE", "ABS_PERIOD", "REL_PERIOD", "FUZZY_PERIOD"}
+LOCATION_LABELS = {"LOCATION"}
+
+def load_ambiguous_ids(strategy_dir: Path) -> set:
+    path = strategy_dir / AMBIGUOUS_NAME
+    if not path.exists():
+        raise SystemExit(f"❌ {path} introuvable. Lancez select_ambiguous.py d'abord.")
+    return set(json.loads(path.read_text(encoding="utf-8"))["ids"])
+
+def load_entity_labels(path: Path) -> dict:
+    """{doc_id: ({id: label}, {texte normalisé: {labels}})} des prédictions NER ({} si absentes)"""
+    if not path.exists():
+        print(f"⚠️ {path} introuvable : lieu et date des événements non vérifiés")
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        docs = json.load(f)
+    labels = {}
+    for doc in docs:
+        by_id, by_text = {}, {}
+        for ent in doc.get("entities", []):
+            by_id[ent.get("id")] = ent["label"]
+            by_text.setdefault(normalize(ent["text"]), set()).add(ent["label"])
+        labels[doc["doc_id"]] = (by_id, by_text)
+    return labels
+
+def attribute_labels(attr, doc_labels, handle_ids) -> set:
+    """Labels de l'entité désignée par un attribut (poignée ou texte)"""
+    by_id, by_text = doc_labels
+    if handle_ids is not None:
+        h = attr.get("entity")
+        ids = handle_ids[h] if isinstance(h, int) and 0 <= h < len(handle_ids) else []
+        return {by_id[i] for i in ids if i in by_id}
+    value = attr.get("value") or ""
+    labels = set(by_text.get(normalize(value), ()))
+    if not labels and DATE_RE.search(value):
+        labels = {"ABS_DATE"}
+    return labels
+
+def ambiguity_reasons(prediction, text: str, doc_labels=None, handle_ids=None) -> list:
+    if not prediction or "output" not in prediction:
+        return ["erreur"]
+    events = prediction["output"].get("events", [])
+    if not events:
+        return ["aucun_evenement"] if DISEASE_RE.search(text) or NRBCE_RE.search(text) else []
+
+    reasons = set()
+    lowered = text.lower()
+    for event in events:
+        attributes = [attr.get("attribute", "").removeprefix("evt:") for attr in event]
+        if attributes.count("central_element") != 1:
+            reasons.add("element_central")
+        associated = [attr for attr, name in zip(event, attributes) if name == "associated_element"]
+        if doc_labels:
+            labels = set().union(*(attribute_labels(attr, doc_labels, handle_ids) for attr in associated))
+            if not (labels & LOCATION_LABELS and labels & DATE_LABELS):
+                reasons.add("incomplet")
+        elif len(associated) < 2:
+            reasons.add("incomplet")
+        for attr in event:
+            value = attr.get("value")
+            if value is not None and value.strip().lower() not in lowered:
+                reasons.add("valeur_absente")
+    return sorted(reasons)
+
+def select_strategy(strategy_dir: Path, texts: list):
+    outputs_path = RESULTS_DIR / f"{strategy_dir.name}_outputs.jsonl"
+    if not outputs_path.exists():
+        print(f"⚠️ Pas de sorties de 1re passe pour {strategy_dir.name}")
+        return
+    with open(outputs_path, "r", encoding="utf-8") as f:
+        predictions = {}
+        for line in f:
+            if line.strip():
+                pred = json.loads(line)
+                predictions[pred.get("id")] = pred   # la plus récente l'emporte
+
+    chunks_path = strategy_dir / CHUNKS_NAME
+    chunks = json.loads(chunks_path.read_text(encoding="utf-8")) if chunks_path.exists() else {}
+    inventories = load_inventories(strategy_dir)
+    entity_labels = load_entity_labels(inventory_predictions(strategy_dir) or NER_PREDICTIONS_PATH)
+
+    prompt_ids = sorted(pf.stem for pf in strategy_dir.glob("prompt_*.txt"))
+    reasons = {}
+    for prompt_id in prompt_ids:
+        if prompt_id in chunks:          # prompt_XXX_cYY : fenêtre d'un document
+            chunk = chunks[prompt_id]
+            doc_index, text = chunk["doc"], texts[chunk["doc"]][chunk["start"]:chunk["end"]]
+        else:
+            doc_index = segment_index(prompt_id)
+            text = texts[doc_index]
+        found = ambiguity_reasons(predictions.get(prompt_id), text,
+                                  entity_labels.get(f"doc_{doc_index}"),
+                                  inventories.get(prompt_id) if inventories is not None else None)
+        if found:
+            reasons[prompt_id] = found
+
+    (strategy_dir / AMBIGUOUS_NAME).write_text(
+        json.dumps({"ids": sorted(reasons), "reasons": reasons}, ensure_ascii=False, indent=2),
+        encoding="utf-8")
+    share = len(reasons) / len(prompt_ids) if prompt_ids else 0
+    print(f"🔎 {strategy_dir.name} : {len(reasons)}/{len(prompt_ids)} prompts ambigus ({share:.0%})")
+
+if __name__ == "__main__":
+    with open(TEST_JSON_PATH, "r", encoding="utf-8") as f:
+        texts = [doc["text"] for doc in json.load(f)]
+    for strategy_dir in sorted(d for d in PROMPT_ROOT_DIR.iterdir() if d.is_dir()):
+        select_strategy(strategy_dir, texts)
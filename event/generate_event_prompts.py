@@ -1,13 +1,87 @@
+"""
+Génération des prompts événements, commune aux deux pipelines : prompts
+sous <pipeline>/generated_prompts/events, réponses périmées retirées de
+<pipeline>/batch_results.
+    python event/generate_event_prompts.py [--pipeline event-cot]
+"""
+
+import argparse
+import hashlib
 import json
+import sys
 from pathlib import Path
 import random
 
+# Modules partagés avec le pipeline NER (magasin de démonstrations, …)
+sys.path.append(str(Path(__file__).resolve().parents[1] / "ner"))
+from demo_store import load_demos, make_record, write_store
+from token_accounting import get_counter
+from text_windows import chunk_spans, compress, trim_to_events
+from demo_retrieval import DemoIndex, label_profile, load_predicted_profiles
+from entity_inventory import (build_inventory, format_events, format_inventory, normalize,
+                              save_inventories)
+from ner_gate import CENTRAL_LABELS, gate_documents, save_gated
+from near_duplicate_docs import load_clusters
+from prompt_manifest import merge_changes
+
 # === Paramètres ===
 MAIN_PROMPT_PATH = "event/prompt_elements/main.txt"
 TRAIN_JSON_PATH = "event/datasets_textual_events/train.json"
 TEST_JSON_PATH = "./datasets/test.json"
-OUTPUT_BASE_DIR = Path("event/generated_prompts/events")
+PIPELINES = ["event", "event-cot"]
 K_VALUES = [4, 8]  # différentes valeurs de few-shot
+SEED = 0           # tirage des démonstrations reproductible (prompts stables d'un run à l'autre)
+HASHES_NAME = "hashes.json"    # {prompt_id: hash des entrées} du dernier run
+MODEL = "gpt-4.1"
+
+# Démos réduites aux phrases porteuses d'événements (± CONTEXT_SENTENCES
+# phrases, « […] » entre les passages gardés) au lieu de l'article complet.
+# Magasin de démos et dossiers de sortie suffixés "_trim<N>".
+TRIM_DEMOS = False
+CONTEXT_SENTENCES = 1
+
+# Mode inventaire : les entités (prédites par le NER pour les cibles) sont
+# listées avec un numéro [n] que le modèle renvoie à la place du texte
+# (schéma à enum par requête, voir entity_inventory.py). Suffixe "_inv".
+INVENTORY_MODE = False
+
+# Mode découpé : chaque document cible est coupé en fenêtres de phrases d'au
+# plus CHUNK_TOKENS tokens (recouvrement de CHUNK_OVERLAP phrases), un prompt
+# par fenêtre (prompt_XXX_cYY, positions dans chunks.json). Les événements
+# des fenêtres sont fusionnés par merge_chunk_events.py. Suffixe "_chunk<N>".
+CHUNK_TOKENS = None        # ex. 1_500
+CHUNK_OVERLAP = 1
+CHUNKS_NAME = "chunks.json"
+
+# Filtre NER : pas de prompt pour les documents dont les prédictions NER
+# (NER_PREDICTIONS_PATH) ne contiennent aucun élément central candidat ;
+# les scripts de reconstruction leur donnent une liste d'événements vide.
+NER_GATE = False
+
+# Compression des cibles : seules les phrases contenant (± COMPRESS_CONTEXT
+# phrases) une entité prédite d'un label de COMPRESS_LABELS sont envoyées,
+# « […] » ailleurs. Segments [début compressé, début original, longueur]
+# par prompt dans compression.json (ner/text_windows.to_original). Suffixe "_ctx<N>".
+COMPRESS_TARGETS = False
+COMPRESS_CONTEXT = 1
+COMPRESS_LABELS = CENTRAL_LABELS | {
+    "LOCATION", "ABS_DATE", "REL_DATE", "DOC_DATE", "ABS_PERIOD", "REL_PERIOD", "FUZZY_PERIOD",
+}
+COMPRESSION_NAME = "compression.json"
+
+# Articles quasi identiques (ner/near_duplicate_docs.py) : pas de prompt pour
+# les membres non signalés, les scripts de reconstruction leur recopient les
+# événements du représentant.
+NEAR_DUP_PROPAGATION = False
+
+SUFFIX = (f"_trim{CONTEXT_SENTENCES}" if TRIM_DEMOS else "") + ("_inv" if INVENTORY_MODE else "")
+DEMO_STORE_PATH = Path(f"event/demo_store/events{SUFFIX}.jsonl")  # démos rendues + labels + nb de tokens
+
+# Sélection des démos : "random" (même tirage pour toutes les cibles) ou
+# "profile" (k démos les plus proches du profil de labels prédit par le NER
+# pour chaque cible). Dossiers de sortie suffixés "_profile".
+DEMO_SELECTION = "random"
+NER_PREDICTIONS_PATH = Path("ner/reconstructed_outputs_2/density_k8_reconstructed.json")  # profils / inventaires
 
 # === Fonctions ===
 
@@ -16,18 +90,43 @@ def load_main_prompt():
         return f.read().strip()
 
 def format_fewshot_example(example):
-    formatted = f'Texte: "{example["text"].strip()}"\nÉvénements:\n'
-    for i, event in enumerate(example.get("events", []), 1):
-        lines = []
-        for attr in event:
-            occurrences = attr.get("occurrences", [])
-            first_occ = occurrences[0].strip() if occurrences else "[EMPTY]"
-            lines.append(f"  - {attr['attribute']}: {first_occ}")
-        formatted += f"  Event {i}:\n" + "\n".join(lines) + "\n"
+    text = example["text"].strip()
+    if TRIM_DEMOS:
+        occurrences = [occ for event in example.get("events", [])
+                       for attr in event for occ in attr.get("occurrences", [])]
+        text = trim_to_events(text, occurrences, CONTEXT_SENTENCES)
+    inventory = None
+    if INVENTORY_MODE:
+        entities = [ent for ent in example.get("entities", [])
+                    if normalize(ent["text"]) in normalize(text)]
+        inventory = build_inventory(entities)
+    formatted = format_target_prompt({"text": text}, inventory) + "\n"
+    formatted += format_events(example.get("events", []), inventory)
     return formatted.strip()
 
-def format_target_prompt(example):
-    return f'Texte: "{example["text"].strip()}"\nÉvénements:'
+def build_demo_store(train_data):
+    """
+    Rend une fois chaque document d'entraînement porteur d'événements dans le
+    magasin de démos (reconstruit seulement si train.json est plus récent).
+    """
+    if DEMO_STORE_PATH.exists() and DEMO_STORE_PATH.stat().st_mtime >= Path(TRAIN_JSON_PATH).stat().st_mtime:
+        return load_demos(DEMO_STORE_PATH)
+
+    examples = [ex for ex in train_data if ex.get("events")]
+    blocks = [format_fewshot_example(ex) for ex in examples]
+    n_tokens = get_counter(MODEL).count_many(blocks)
+    records = []
+    for i, (ex, block, n) in enumerate(zip(examples, blocks, n_tokens)):
+        labels = [ent["label"] for ent in ex.get("entities", [])]
+        records.append(make_record(f"events:{i}", block, labels, n))
+    write_store(DEMO_STORE_PATH, records)
+    print(f"🗃️ Magasin de démos : {len(records)} exemples → {DEMO_STORE_PATH}")
+    return records
+
+def format_target_prompt(example, inventory=None):
+    if inventory is None:
+        return f'Texte: "{example["text"].strip()}"\nÉvénements:'
+    return f'Texte: "{example["text"].strip()}"\nEntités:\n{format_inventory(inventory)}\nÉvénements:'
 
 def generate_prompt(main_prompt, fewshot_examples, target_text):
     dashed = "-" * 80
@@ -38,20 +137,126 @@ def load_json(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def save_prompts(all_prompts, output_dir):
+def prompt_hash(main_prompt, fewshot_examples, target_text):
+    """Identifiant de contenu d'un prompt (prompt principal, démonstrations, cible)"""
+    payload = json.dumps([main_prompt, fewshot_examples, target_text], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def save_prompts(all_prompts, output_dir, hashes, results_dir, prompt_ids=None):
+    """
+    N'écrit que les prompts dont le fichier a changé depuis le dernier run.
+    Le delta est calculé sur les hash (voir prompt_manifest.merge_changes) :
+    un prompt décalé par l'ajout d'un document garde sa réponse, seuls les
+    contenus nouveaux sont ajoutés au delta en attente de changes.json.
+    """
+    if prompt_ids is None:
+        prompt_ids = [f"prompt_{i:03}" for i in range(len(all_prompts))]
     output_dir.mkdir(parents=True, exist_ok=True)
-    for i, prompt in enumerate(all_prompts):
-        output_file = output_dir / f"prompt_{i:03}.txt"
+    hashes_path = output_dir / HASHES_NAME
+    previous = json.loads(hashes_path.read_text(encoding="utf-8")) if hashes_path.exists() else {}
+
+    current = {}
+    for prompt_id, prompt, h in zip(prompt_ids, all_prompts, hashes):
+        current[prompt_id] = h
+        output_file = output_dir / f"{prompt_id}.txt"
+        if previous.get(prompt_id) == h and output_file.exists():
+            continue
         with open(output_file, "w", encoding="utf-8") as f:
             f.write(prompt)
-    print(f"✅ {len(all_prompts)} prompts saved in '{output_dir}/'.")
+
+    for prompt_id in set(previous) - set(current):
+        (output_dir / f"{prompt_id}.txt").unlink(missing_ok=True)
+
+    hashes_path.write_text(json.dumps(current, indent=2), encoding="utf-8")
+    changes = merge_changes(output_dir, previous, current, results_dir)
+    print(f"✅ {len(all_prompts)} prompts in '{output_dir}/' — "
+          f"{len(changes['changed'])} modifié(s), {changes['moved']} décalé(s), "
+          f"{len(changes['removed'])} supprimé(s).")
+    if 0 < len(changes["changed"]) <= 20:
+        print("   ↳ " + ", ".join(changes["changed"]))
 
 # === Exécution principale ===
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère les prompts événements")
+    parser.add_argument("--pipeline", choices=PIPELINES, default="event")
+    root = Path(parser.parse_args().pipeline)
+    OUTPUT_BASE_DIR = root / "generated_prompts" / "events"
+    RESULTS_DIR = root / "batch_results"      # <dossier>_outputs.jsonl (retriever.py)
+
     main_prompt = load_main_prompt()
     train_data = load_json(TRAIN_JSON_PATH)
     test_data = load_json(TEST_JSON_PATH)
-    candidates = [ex for ex in train_data if ex.get("events")]
+    candidates = build_demo_store(train_data)
+    rng = random.Random(SEED)
+
+    if DEMO_SELECTION == "profile":
+        examples = [ex for ex in train_data if ex.get("events")]
+        index = DemoIndex([demo["id"] for demo in candidates],
+                          [label_profile(ex.get("entities", [])) for ex in examples])
+        target_profiles = load_predicted_profiles(NER_PREDICTIONS_PATH, len(test_data))
+        print(f"🧭 Profils NER : {sum(1 for p in target_profiles if p)}/{len(test_data)} cibles")
+    blocks = {demo["id"]: demo["block"] for demo in candidates}
+
+    predicted = {}
+    if INVENTORY_MODE or COMPRESS_TARGETS:
+        with open(NER_PREDICTIONS_PATH, "r", encoding="utf-8") as f:
+            predicted = {doc["doc_id"]: doc.get("entities", []) for doc in json.load(f)}
+
+    gated = set()
+    if NER_GATE:
+        gated = set(gate_documents(NER_PREDICTIONS_PATH, len(test_data)))
+
+    near_dups = load_clusters(len(test_data)) if NEAR_DUP_PROPAGATION else {}
+    if near_dups:
+        print(f"📰 {len(near_dups)} document(s) quasi identique(s) : événements du représentant")
+
+    # Cibles : un prompt par document, ou par fenêtre en mode découpé
+    targets, chunks, gated_texts = [], {}, []
+    for i, example in enumerate(test_data):
+        if i in gated:
+            gated_texts.append(format_target_prompt(example))
+            continue
+        if i in near_dups:
+            continue
+        if not CHUNK_TOKENS:
+            targets.append((f"prompt_{i:03}", i, example, predicted.get(f"doc_{i}", [])))
+            continue
+        spans = chunk_spans(example["text"], CHUNK_TOKENS, CHUNK_OVERLAP, get_counter(MODEL).count_many)
+        for j, (start, end) in enumerate(spans):
+            prompt_id = f"prompt_{i:03}_c{j:02}"
+            entities = [ent for ent in predicted.get(f"doc_{i}", [])
+                        if start <= min(ent.get("start") or [0]) < end]
+            targets.append((prompt_id, i, {"text": example["text"][start:end]}, entities))
+            chunks[prompt_id] = {"doc": i, "start": start, "end": end}
+    if CHUNK_TOKENS:
+        print(f"✂️ {len(targets)} fenêtres pour {len(test_data)} documents")
+
+    compression = {}
+    if COMPRESS_TARGETS:
+        full_texts = [example["text"] for _, _, example, _ in targets]
+        for t, (prompt_id, doc_index, example, entities) in enumerate(targets):
+            base = chunks[prompt_id]["start"] if CHUNK_TOKENS else 0
+            positions = [start - base for ent in entities if ent["label"] in COMPRESS_LABELS
+                         for start in ent.get("start", [])]
+            text, mapping = compress(example["text"], positions, COMPRESS_CONTEXT)
+            # Inventaire limité aux entités encore visibles
+            kept = [ent for ent in entities
+                    if any(o <= min(ent.get("start") or [0]) - base < o + n for _, o, n in mapping)]
+            targets[t] = (prompt_id, doc_index, {"text": text}, kept)
+            compression[prompt_id] = [[c, o + base, n] for c, o, n in mapping]
+        counter = get_counter(MODEL)
+        before = sum(counter.count_many(full_texts))
+        after = sum(counter.count_many([example["text"] for _, _, example, _ in targets]))
+        print(f"🗜️ Compression des cibles : {before:,} → {after:,} tokens "
+              f"({(after - before) / max(before, 1):+.0%})")
+
+    if NER_GATE:
+        print(f"⛔ Filtre NER : {len(gated)}/{len(test_data)} documents sans élément central candidat")
+
+    inventories = [build_inventory(entities) if INVENTORY_MODE else None
+                   for _, _, _, entities in targets]
+    if INVENTORY_MODE:
+        print(f"🏷️ Inventaires : {sum(map(len, inventories))} poignées pour {len(targets)} cibles")
 
     for k in K_VALUES:
         print(f"\n🔧 Génération des prompts pour k={k}")
@@ -59,13 +264,39 @@ if __name__ == "__main__":
             print(f"⚠️ Pas assez d'exemples pour k={k}. Skipping.")
             continue
 
-        fewshot_raw = random.sample(candidates, k=k)
-        fewshot_formatted = [format_fewshot_example(ex) for ex in fewshot_raw]
+        default_ids = [demo["id"] for demo in rng.sample(candidates, k=k)]
+        selections = [default_ids] * len(test_data)
+        out_dir = OUTPUT_BASE_DIR / f"events_k{k}{SUFFIX}"
+        if CHUNK_TOKENS:
+            out_dir = out_dir.with_name(out_dir.name + f"_chunk{CHUNK_TOKENS}")
+        if COMPRESS_TARGETS:
+            out_dir = out_dir.with_name(out_dir.name + f"_ctx{COMPRESS_CONTEXT}")
+        if DEMO_SELECTION == "profile":
+            selections = index.select(target_profiles, k, default_ids)
+            out_dir = out_dir.with_name(out_dir.name + "_profile")
 
-        prompts = []
-        for example in test_data:
-            target = format_target_prompt(example)
+        prompts, hashes = [], []
+        for (_, doc_index, example, _), inventory in zip(targets, inventories):
+            fewshot_formatted = [blocks[demo_id] for demo_id in selections[doc_index]]
+            target = format_target_prompt(example, inventory)
             prompt = generate_prompt(main_prompt, fewshot_formatted, target)
             prompts.append(prompt)
+            hashes.append(prompt_hash(main_prompt, fewshot_formatted, target))
 
-        save_prompts(prompts, OUTPUT_BASE_DIR / f"events_k{k}")
+        prompt_ids = [prompt_id for prompt_id, _, _, _ in targets]
+        save_prompts(prompts, out_dir, hashes, RESULTS_DIR, prompt_ids)
+        save_gated(out_dir, gated)
+        if NER_GATE:
+            # Tokens d'entrée évités : prompt principal et démos par défaut + cible
+            fewshot_formatted = [blocks[demo_id] for demo_id in default_ids]
+            saved = sum(get_counter(MODEL).count_prompts(
+                [generate_prompt(main_prompt, fewshot_formatted, t) for t in gated_texts]))
+            print(f"💸 {len(gated)} requête(s) évitée(s), ~{saved:,} tokens d'entrée")
+        if INVENTORY_MODE:
+            save_inventories(out_dir, {prompt_id: [item["ids"] for item in inventory]
+                                       for prompt_id, inventory in zip(prompt_ids, inventories)},
+                             NER_PREDICTIONS_PATH)
+        if CHUNK_TOKENS:
+            (out_dir / CHUNKS_NAME).write_text(json.dumps(chunks, indent=2), encoding="utf-8")
+        if COMPRESS_TARGETS:
+            (out_dir / COMPRESSION_NAME).write_text(json.dumps(compression), encoding="utf-8")
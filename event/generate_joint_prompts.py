@@ -0,0 +1,88 @@
+"""
+Prompts conjoints NER + événements : une requête par document (texte
+complet) qui renvoie les entités et les événements, ces derniers désignant
+les entités par leur indice dans la liste renvoyée. Les démonstrations
+montrent les entités de référence numérotées [n] et les événements par
+poignée (même rendu que le mode inventaire de generate_event_prompts.py).
+
+Sortie : event/generated_prompts/joint/joint_k<k>/prompt_XXX.txt
+(batch avec prepare_batches.py en mode JOINT, puis rebuild_joint_outputs.py).
+"""
+
+import random
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "ner"))
+from demo_store import load_demos, make_record, write_store
+from token_accounting import get_counter
+from entity_inventory import build_inventory, format_events
+from generate_event_prompts import (format_target_prompt, generate_prompt, load_json,
+                                    prompt_hash, save_prompts)
+
+# === Paramètres ===
+NER_PROMPT_PATH = "ner/prompt_elements/main_prompt.txt"
+EVENT_PROMPT_PATH = "event/prompt_elements/main.txt"
+JOINT_PROMPT_PATH = "event/prompt_elements/joint.txt"
+TRAIN_JSON_PATH = "event/datasets_textual_events/train.json"
+TEST_JSON_PATH = "./datasets/test.json"
+OUTPUT_BASE_DIR = Path("event/generated_prompts/joint")
+RESULTS_DIR = Path("event/batch_results")     # joint_k<k>_outputs.jsonl
+DEMO_STORE_PATH = Path("event/demo_store/joint.jsonl")
+K_VALUES = [2, 4]  # documents complets : moins de démos que pour les événements seuls
+SEED = 0
+MODEL = "gpt-4.1"
+
+# === Fonctions ===
+def load_main_prompt():
+    """Règles NER + règles événements + consignes du mode conjoint"""
+    parts = [Path(p).read_text(encoding="utf-8").strip()
+             for p in (NER_PROMPT_PATH, EVENT_PROMPT_PATH, JOINT_PROMPT_PATH)]
+    return "\n\n".join(parts)
+
+def format_joint_example(example):
+    inventory = build_inventory(example.get("entities", []))
+    formatted = format_target_prompt(example, inventory) + "\n"
+    formatted += format_events(example.get("events", []), inventory)
+    return formatted.strip()
+
+def format_joint_target(example):
+    return f'Texte: "{example["text"].strip()}"\nEntités et événements:'
+
+def build_demo_store(train_data):
+    """Démos conjointes rendues une fois (reconstruit si train.json est plus récent)"""
+    if DEMO_STORE_PATH.exists() and DEMO_STORE_PATH.stat().st_mtime >= Path(TRAIN_JSON_PATH).stat().st_mtime:
+        return load_demos(DEMO_STORE_PATH)
+
+    examples = [ex for ex in train_data if ex.get("events")]
+    blocks = [format_joint_example(ex) for ex in examples]
+    n_tokens = get_counter(MODEL).count_many(blocks)
+    records = []
+    for i, (ex, block, n) in enumerate(zip(examples, blocks, n_tokens)):
+        labels = [ent["label"] for ent in ex.get("entities", [])]
+        records.append(make_record(f"joint:{i}", block, labels, n))
+    write_store(DEMO_STORE_PATH, records)
+    print(f"🗃️ Magasin de démos conjointes : {len(records)} exemples → {DEMO_STORE_PATH}")
+    return records
+
+# === Exécution principale ===
+if __name__ == "__main__":
+    main_prompt = load_main_prompt()
+    test_data = load_json(TEST_JSON_PATH)
+    candidates = build_demo_store(load_json(TRAIN_JSON_PATH))
+    rng = random.Random(SEED)
+
+    for k in K_VALUES:
+        print(f"\n🔧 Génération des prompts conjoints pour k={k}")
+        if k > len(candidates):
+            print(f"⚠️ Pas assez d'exemples pour k={k}. Skipping.")
+            continue
+
+        fewshot_formatted = [demo["block"] for demo in rng.sample(candidates, k=k)]
+        prompts, hashes = [], []
+        for example in test_data:
+            target = format_joint_target(example)
+            prompts.append(generate_prompt(main_prompt, fewshot_formatted, target))
+            hashes.append(prompt_hash(main_prompt, fewshot_formatted, target))
+
+        save_prompts(prompts, OUTPUT_BASE_DIR / f"joint_k{k}", hashes, RESULTS_DIR)
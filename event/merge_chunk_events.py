@@ -0,0 +1,149 @@
+"""
+Étape « reduce » du mode découpé de generate_event_prompts.py.
+
+Les événements extraits fenêtre par fenêtre (prompt_XXX_cYY) sont reliés
+aux ids d'entités (poignées en mode inventaire, sinon texte exact en
+minuscules comme rebuild_events_With_entity_ids.py), regroupés par
+document, puis fusionnés : deux événements qui partagent un id d'élément
+central (union-find) n'en font qu'un, sans attribut en double. Sortie au
+même format que rebuild_events_With_entity_ids.py.
+
+Script commun aux deux pipelines (dossiers de prompts, de sorties et de
+résultats sous <pipeline>/) :
+    python event/merge_chunk_events.py [--pipeline event-cot]
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+# Modules partagés avec le pipeline NER (inventaires, clusters de quasi-doublons, …)
+sys.path.append(str(Path(__file__).resolve().parents[1] / "ner"))
+from entity_inventory import inventory_predictions, load_inventories, matches_inventory, resolve_events
+from ner_gate import load_gated
+from generate_event_prompts import CHUNKS_NAME
+from near_duplicate_docs import load_clusters, propagate_events
+
+# === Dossiers ===
+RECONSTRUCTED_DIR = Path("ner/reconstructed_outputs")
+PIPELINES = ["event", "event-cot"]   # <pipeline>/generated_prompts/events, batch_results, final_outputs
+K_RANGE = [4, 8]
+SUFFIX = "_chunk1500"        # suffixe du dossier de prompts découpés (ex. "_inv_chunk1500")
+CENTRAL = "evt:central_element"
+
+def match_by_text(output, doc):
+    """Événements d'une fenêtre → ids, par texte exact (minuscules)"""
+    entity_map = defaultdict(list)
+    for ent in doc["entities"]:
+        entity_map[ent["text"].strip().lower()].append(ent["id"])
+    events = []
+    for event in output.get("events", []):
+        block = [{"attribute": "evt:" + attr.get("attribute", "").strip(),
+                  "occurrences": entity_map[attr.get("value", "").strip().lower()]}
+                 for attr in event if entity_map.get(attr.get("value", "").strip().lower())]
+        if block:
+            events.append(block)
+    return events
+
+def merge_events(events):
+    """Fusionne les événements qui partagent un élément central (union-find)"""
+    parent = list(range(len(events)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    for i, event in enumerate(events):
+        for attr in event:
+            if attr["attribute"] != CENTRAL:
+                continue
+            for ent_id in attr["occurrences"]:
+                if ent_id in owner:
+                    parent[find(i)] = find(owner[ent_id])
+                else:
+                    owner[ent_id] = i
+
+    groups = defaultdict(list)
+    for i in range(len(events)):
+        groups[find(i)].append(i)
+
+    merged = []
+    for members in sorted(groups.values()):
+        seen, block = set(), []
+        for i in members:
+            for attr in events[i]:
+                key = (attr["attribute"], tuple(sorted(attr["occurrences"])))
+                if key not in seen:
+                    seen.add(key)
+                    block.append(attr)
+        merged.append(block)
+    return merged
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fusionne les événements des fenêtres par document")
+    parser.add_argument("--pipeline", choices=PIPELINES, default="event")
+    root = Path(parser.parse_args().pipeline)
+    PROMPTS_DIR = root / "generated_prompts" / "events"
+    EVENTS_DIR = root / "batch_results"
+    OUTPUT_DIR = root / "final_outputs"
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Fichiers d'entités, plus ceux sur lesquels les inventaires ont été construits
+    ent_files = set(RECONSTRUCTED_DIR.glob("*.json"))
+    ent_files |= {path for k in K_RANGE if (path := inventory_predictions(PROMPTS_DIR / f"events_k{k}{SUFFIX}"))}
+    for ent_file in sorted(ent_files):
+        with open(ent_file, "r", encoding="utf-8") as f:
+            doc_map = {doc["doc_id"]: doc for doc in json.load(f)}
+        print(f"\n📂 Fichier entités : {ent_file.name} ({len(doc_map)} documents)")
+
+        for k in K_RANGE:
+            prompt_dir = PROMPTS_DIR / f"events_k{k}{SUFFIX}"
+            events_path = EVENTS_DIR / f"events_k{k}{SUFFIX}_outputs.jsonl"
+            if not (prompt_dir / CHUNKS_NAME).exists() or not events_path.exists():
+                print(f"❌ Fenêtres ou sorties manquantes pour k={k}")
+                continue
+            if not matches_inventory(prompt_dir, ent_file):
+                print(f"⏭️ k={k} : inventaires construits sur un autre fichier d'entités, ignoré")
+                continue
+            chunks = json.loads((prompt_dir / CHUNKS_NAME).read_text(encoding="utf-8"))
+            inventories = load_inventories(prompt_dir)
+
+            with open(events_path, "r", encoding="utf-8") as f:
+                predictions = [json.loads(line) for line in f if line.strip()]
+            # Relance incrémentale : la réponse la plus récente d'un même id l'emporte
+            predictions = {p.get("id"): p for p in predictions}
+
+            events_per_doc = defaultdict(list)
+            for prompt_id, chunk in chunks.items():
+                pred = predictions.get(prompt_id)
+                doc = doc_map.get(f"doc_{chunk['doc']}")
+                if not pred or "output" not in pred or not doc:
+                    continue
+                if inventories is not None:
+                    events_per_doc[doc["doc_id"]] += resolve_events(pred["output"], inventories.get(prompt_id, []))
+                else:
+                    events_per_doc[doc["doc_id"]] += match_by_text(pred["output"], doc)
+
+            final_docs = []
+            doc_indices = {chunk["doc"] for chunk in chunks.values()} | set(load_gated(prompt_dir))
+            for doc_index in sorted(doc_indices):
+                doc = doc_map.get(f"doc_{doc_index}")
+                if not doc:
+                    continue
+                raw = events_per_doc.get(doc["doc_id"], [])
+                final_docs.append({"doc_id": doc["doc_id"], "text": doc["text"],
+                                   "entities": doc["entities"], "events": merge_events(raw)})
+            propagate_events(final_docs, doc_map, load_clusters(len(doc_map)))
+            n_raw = sum(map(len, events_per_doc.values()))
+            n_merged = sum(len(d["events"]) for d in final_docs)
+            print(f"🔗 k={k} : {len(chunks)} fenêtres, {n_raw} événements → {n_merged} après fusion")
+
+            output_path = OUTPUT_DIR / f"{ent_file.stem}_with_event_ids_k{k}{SUFFIX}.json"
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump(final_docs, f, ensure_ascii=False, indent=2)
+            print(f"📁 Fichier sauvegardé : {output_path}")
@@ -6,24 +6,33 @@ Ne crée PAS les batchs : chaque lot reste prêt à être lancé.
 """
 
 import json
+import sys
 from pathlib import Path
 from tqdm import tqdm
-import tiktoken
 from openai import OpenAI
 
+# Modules partagés avec le pipeline NER (comptage de tokens, …)
+sys.path.append(str(Path(__file__).resolve().parents[1] / "ner"))
+from token_accounting import get_counter
+from compact_schema import load_labels
+from entity_inventory import (INVENTORY_SYSTEM_PROMPT, JOINT_SYSTEM_PROMPT, build_inventory_schema,
+                              build_joint_schema, load_inventories)
+
 # ── CONFIG ────────────────────────────────────────────────────────────────────
 MODEL = "gpt-4.1"
 TOKEN_LIMIT_PER_BATCH = 1_200_000   # marge
 PROMPT_ROOT_DIR = Path("event/generated_prompts/events")
 OUTPUT_DIR = Path("event/openai_outputs")
 BATCH_INPUT_DIR = OUTPUT_DIR / "batch_inputs"
+ONLY_CHANGED = False                # ne batcher que les prompts listés dans changes.json
+ESTIMATE_ONLY = False               # estimation calibrée (+ marge) au lieu du comptage exact
+JOINT = False                       # prompts conjoints NER + événements (generate_joint_prompts.py)
 
-# ── INIT ─────────────────────────────────────────────────────────────────────
-try:
-    ENCODING = tiktoken.encoding_for_model(MODEL)
-except KeyError:
-    ENCODING = tiktoken.get_encoding("o200k_base")
+if JOINT:
+    PROMPT_ROOT_DIR = Path("event/generated_prompts/joint")
 
+# ── INIT ─────────────────────────────────────────────────────────────────────
+COUNTER = get_counter(MODEL)
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 BATCH_INPUT_DIR.mkdir(parents=True, exist_ok=True)
 client = OpenAI()
@@ -52,11 +61,19 @@ EVENT_SCHEMA = {
     "additionalProperties": False
 }
 
-# ── UTILS ────────────────────────────────────────────────────────────────────
-def count_tokens(text: str) -> int:
-    return len(ENCODING.encode(text))
+SYSTEM_PROMPT = "Tu es un assistant d'extraction d'événements. Tu dois retourner un JSON de la forme : {\"events\": [[{\"attribute\": ..., \"value\": ...}, ...], ...]}"
 
-def build_batch_request(prompt_text: str, prompt_id: str) -> dict:
+if JOINT:
+    EVENT_SCHEMA = build_joint_schema(load_labels())
+    SYSTEM_PROMPT = JOINT_SYSTEM_PROMPT
+
+# ── UTILS ────────────────────────────────────────────────────────────────────
+def build_batch_request(prompt_text: str, prompt_id: str, handle_ids: list = None) -> dict:
+    """Requête Batch ; en mode inventaire, schéma à enum sur les poignées du document"""
+    schema, system_prompt = EVENT_SCHEMA, SYSTEM_PROMPT
+    if handle_ids is not None:
+        schema = build_inventory_schema(len(handle_ids))
+        system_prompt = INVENTORY_SYSTEM_PROMPT
     return {
         "custom_id": prompt_id,
         "method": "POST",
@@ -64,15 +81,13 @@ def build_batch_request(prompt_text: str, prompt_id: str) -> dict:
         "body": {
             "model": MODEL,
             "input": [
-                {"role": "system",
-                "content": "Tu es un assistant d'extraction d'événements. Tu dois retourner un JSON de la forme : {\"events\": [[{\"attribute\": ..., \"value\": ...}, ...], ...]}"
-                    },
+                {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt_text}
             ],
             "text": {"format": {
                     "type": "json_schema",
                     "name": "event_response",
-                    "schema": EVENT_SCHEMA,
+                    "schema": schema,
                     "strict": True
                 }}
         }
@@ -82,13 +97,27 @@ def build_batch_request(prompt_text: str, prompt_id: str) -> dict:
 def prepare_one_strategy(strategy_dir: Path):
     strategy = strategy_dir.name
     prompts  = sorted(strategy_dir.glob("prompt_*.txt"))
+    changes_path = strategy_dir / "changes.json"
+    if ONLY_CHANGED and changes_path.exists():
+        changed = set(json.loads(changes_path.read_text(encoding="utf-8"))["changed"])
+        prompts = [pf for pf in prompts if pf.stem in changed]
+    # Mode inventaire : sans entité prédite, aucun événement à relier
+    inventories = load_inventories(strategy_dir)
+    if inventories is not None:
+        n_before = len(prompts)
+        prompts = [pf for pf in prompts if inventories.get(pf.stem)]
+        if len(prompts) < n_before:
+            print(f"⏭️ {n_before - len(prompts)} prompt(s) sans entité ignoré(s)")
     print(f"\n📂 {strategy}: {len(prompts)} prompts trouvés")
+    if not prompts:
+        return
 
     batches, cur_batch, token_sum = [], [], 0
-    for pf in tqdm(prompts, desc=f"Découpage {strategy}"):
-        txt   = pf.read_text(encoding="utf-8")
-        req   = build_batch_request(txt, pf.stem)
-        tokens = count_tokens(txt)
+    counted = COUNTER.iter_counted(((pf.stem, pf.read_text(encoding="utf-8")) for pf in prompts),
+                                   ESTIMATE_ONLY)
+    for prompt_id, txt, tokens in tqdm(counted, total=len(prompts), desc=f"Découpage {strategy}"):
+        req   = build_batch_request(txt, prompt_id,
+                                    inventories[prompt_id] if inventories is not None else None)
         if token_sum + tokens > TOKEN_LIMIT_PER_BATCH:
             batches.append(cur_batch)
             cur_batch, token_sum = [], 0
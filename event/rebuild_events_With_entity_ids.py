@@ -1,7 +1,16 @@
 import json
+import sys
 from pathlib import Path
 from collections import defaultdict
 
+# Modules partagés avec le pipeline NER (inventaires, clusters de quasi-doublons, …)
+sys.path.append(str(Path(__file__).resolve().parents[1] / "ner"))
+from entity_inventory import inventory_predictions, load_inventories, matches_inventory, resolve_events
+from ner_gate import load_gated
+from near_duplicate_docs import load_clusters, propagate_events
+from segment_registry import segment_index
+from generate_event_prompts import CHUNKS_NAME
+
 # === Dossiers ===
 RECONSTRUCTED_DIR = Path("ner/reconstructed_outputs")  # contient les fichiers d'entités
 EVENTS_DIR = Path("event/batch_results")                # contient les outputs d'inférence
@@ -11,20 +20,38 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 # === Liste des valeurs de k à considérer ===
 K_RANGE = [4,  8]  # adapter si besoin
 
-# === Parcours de chaque fichier d'entités ===
-for ent_file in sorted(RECONSTRUCTED_DIR.glob("*.json")):
+# Suffixe des dossiers de prompts (ex. "_inv"). Si le dossier contient un
+# inventories.json (mode inventaire), les poignées renvoyées par le modèle
+# sont résolues directement en ids, sans appariement textuel, et seulement
+# contre le fichier de prédictions NER qui a servi à les construire.
+PROMPTS_DIR = Path("event/generated_prompts/events")
+SUFFIX = ""
+
+# === Parcours de chaque fichier d'entités (et de ceux des inventaires) ===
+ent_files = set(RECONSTRUCTED_DIR.glob("*.json"))
+ent_files |= {path for k in K_RANGE if (path := inventory_predictions(PROMPTS_DIR / f"events_k{k}{SUFFIX}"))}
+for ent_file in sorted(ent_files):
     print(f"\n📂 Traitement fichier entités : {ent_file.name}")
     with open(ent_file, "r", encoding="utf-8") as f:
         entities_data = json.load(f)
     doc_map = {doc["doc_id"]: doc for doc in entities_data}
 
     print(f"✅ {len(doc_map)} documents trouvés.")
+    near_dups = load_clusters(len(doc_map))
 
     # === Parcours de chaque valeur de k ===
     for k in K_RANGE:
         print(f"\n➡️ Traitement pour k = {k}")
 
-        events_path = EVENTS_DIR / f"events_k{k}_outputs.jsonl"
+        events_path = EVENTS_DIR / f"events_k{k}{SUFFIX}_outputs.jsonl"
+        if (PROMPTS_DIR / f"events_k{k}{SUFFIX}" / CHUNKS_NAME).exists():
+            print(f"⏭️ Dossier découpé (prompt_XXX_cYY) : utiliser merge_chunk_events.py")
+            continue
+        if not matches_inventory(PROMPTS_DIR / f"events_k{k}{SUFFIX}", ent_file):
+            print(f"⏭️ Inventaires construits sur un autre fichier d'entités : {ent_file.name} ignoré")
+            continue
+        inventories = load_inventories(PROMPTS_DIR / f"events_k{k}{SUFFIX}")
+        gated = load_gated(PROMPTS_DIR / f"events_k{k}{SUFFIX}")
         if not events_path.exists():
             print(f"❌ Fichier événements manquant : {events_path.name}")
             continue
@@ -35,6 +62,8 @@ for ent_file in sorted(RECONSTRUCTED_DIR.glob("*.json")):
             for line in f:
                 if line.strip():
                     event_predictions.append(json.loads(line))
+        # Relance incrémentale : la réponse la plus récente d'un même id l'emporte
+        event_predictions = list({p.get("id"): p for p in event_predictions}.values())
 
         final_docs = []
         for pred in event_predictions:
@@ -46,7 +75,7 @@ for ent_file in sorted(RECONSTRUCTED_DIR.glob("*.json")):
             # Convertir prompt_000 → doc_0
             if pred_id.startswith("prompt_"):
                 try:
-                    doc_index = int(pred_id.replace("prompt_", ""))
+                    doc_index = segment_index(pred_id)
                     doc_id = f"doc_{doc_index}"
                 except ValueError:
                     continue
@@ -58,6 +87,13 @@ for ent_file in sorted(RECONSTRUCTED_DIR.glob("*.json")):
                 print(f"⚠️ Aucun document trouvé pour {doc_id}")
                 continue
 
+            if inventories is not None:
+                structured_events = resolve_events(pred["output"], inventories.get(pred_id, []))
+                final_docs.append({"doc_id": doc_id, "text": doc["text"],
+                                   "entities": doc["entities"], "events": structured_events})
+                print(f"✅ {doc_id} : {len(structured_events)} événements ajoutés.")
+                continue
+
             # === Création du dictionnaire texte → ID
             entity_map = defaultdict(list)
             for ent in doc["entities"]:
@@ -91,8 +127,30 @@ for ent_file in sorted(RECONSTRUCTED_DIR.glob("*.json")):
             final_docs.append(doc_with_events)
             print(f"✅ {doc_id} : {len(structured_events)} événements ajoutés.")
 
+        # Mode inventaire : documents sans entité non envoyés, donc sans événement
+        if inventories is not None:
+            for pid, handle_ids in inventories.items():
+                doc = doc_map.get(f"doc_{segment_index(pid)}")
+                if doc and not handle_ids:
+                    final_docs.append({"doc_id": doc["doc_id"], "text": doc["text"],
+                                       "entities": doc["entities"], "events": []})
+
+        # Filtre NER : documents sans élément central candidat, non envoyés
+        for doc_index in gated:
+            doc = doc_map.get(f"doc_{doc_index}")
+            if doc:
+                final_docs.append({"doc_id": doc["doc_id"], "text": doc["text"],
+                                   "entities": doc["entities"], "events": []})
+        if gated:
+            print(f"⛔ {len(gated)} document(s) filtré(s) par le NER → événements vides")
+
+        # Articles quasi identiques non envoyés : événements du représentant
+        n_copied = propagate_events(final_docs, doc_map, near_dups)
+        if n_copied:
+            print(f"📰 {n_copied} document(s) quasi identique(s) → événements du représentant")
+
         # === Sauvegarde du résultat
-        out_name = f"{ent_file.stem}_with_event_ids_k{k}.json"
+        out_name = f"{ent_file.stem}_with_event_ids_k{k}{SUFFIX}.json"
         output_path = OUTPUT_DIR / out_name
         with open(output_path, "w", encoding="utf-8") as f:
             json.dump(final_docs, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,94 @@
+"""
+Sorties du mode conjoint (entités + événements par indice) → format final
+de rebuild_events_With_entity_ids.py :
+    {"doc_id", "text", "entities": [{"text", "start", "end", "label", "id"}],
+     "events": [[{"attribute": "evt:…", "occurrences": [ids]}, ...], ...]}
+Chaque entité renvoyée est alignée sur toutes ses occurrences (mots entiers,
+sans chevauchement) dans le texte du document, qui est aussi le texte vu par
+le modèle ; un événement référence les ids de toutes ces occurrences.
+"""
+
+import json
+import re
+from pathlib import Path
+
+# === Dossiers ===
+TEST_JSON_PATH = Path("datasets/test.json")
+EVENTS_DIR = Path("event/batch_results")      # joint_k<k>_outputs.jsonl
+OUTPUT_DIR = Path("event/final_outputs")
+OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+K_RANGE = [2, 4]
+
+def align_entities(text, predicted):
+    """
+    Entités avec offsets globaux + ids des occurrences de chaque entité renvoyée.
+    Occurrences limitées aux mots entiers (« mai » n'est pas pris dans
+    « maintenant ») ; une zone déjà attribuée à une entité plus longue (ou
+    renvoyée plus tôt, à longueur égale) n'est pas réattribuée : « Paris »
+    n'est pas repris dans « Université de Paris ».
+    """
+    spans_per_index, claimed = [[] for _ in predicted], []
+    order = sorted(range(len(predicted)), key=lambda j: -len(predicted[j]["text"].strip()))
+    for j in order:
+        surface = predicted[j]["text"].strip()
+        if not surface:
+            continue
+        for m in re.finditer(rf"(?<!\w){re.escape(surface)}(?!\w)", text):
+            if any(m.start() < e and s < m.end() for s, e in claimed):
+                continue
+            claimed.append((m.start(), m.end()))
+            spans_per_index[j].append((m.start(), m.end()))
+
+    # Ids dans l'ordre du texte
+    ordered = sorted((span, j) for j, spans in enumerate(spans_per_index) for span in spans)
+    entities, ids_per_index = [], [[] for _ in predicted]
+    for (start, end), j in ordered:
+        ent_id = f"T{len(entities) + 1}"
+        entities.append({"text": text[start:end], "start": [start], "end": [end],
+                         "label": predicted[j]["label"], "id": ent_id})
+        ids_per_index[j].append(ent_id)
+    for ent, ids in zip(predicted, ids_per_index):
+        if not ids:
+            print(f"🔍 Entité introuvable dans le texte : '{ent['text']}'")
+    return entities, ids_per_index
+
+def resolve_joint_events(events, ids_per_index):
+    structured = []
+    for event in events:
+        block = [{"attribute": "evt:" + attr["attribute"], "occurrences": ids_per_index[attr["entity"]]}
+                 for attr in event
+                 if 0 <= attr.get("entity", -1) < len(ids_per_index) and ids_per_index[attr["entity"]]]
+        if block:
+            structured.append(block)
+    return structured
+
+if __name__ == "__main__":
+    with open(TEST_JSON_PATH, "r", encoding="utf-8") as f:
+        test_docs = json.load(f)
+
+    for k in K_RANGE:
+        outputs_path = EVENTS_DIR / f"joint_k{k}_outputs.jsonl"
+        if not outputs_path.exists():
+            print(f"❌ Fichier manquant : {outputs_path}")
+            continue
+
+        with open(outputs_path, "r", encoding="utf-8") as f:
+            predictions = [json.loads(line) for line in f if line.strip()]
+        # Relance incrémentale : la réponse la plus récente d'un même id l'emporte
+        predictions = {p.get("id"): p for p in predictions}
+
+        final_docs = []
+        for i, doc in enumerate(test_docs):
+            pred = predictions.get(f"prompt_{i:03}")
+            if not pred or "output" not in pred:
+                print(f"⚠️ Pas de sortie pour doc_{i}")
+                continue
+            entities, ids_per_index = align_entities(doc["text"], pred["output"].get("entities", []))
+            events = resolve_joint_events(pred["output"].get("events", []), ids_per_index)
+            final_docs.append({"doc_id": f"doc_{i}", "text": doc["text"],
+                               "entities": entities, "events": events})
+
+        output_path = OUTPUT_DIR / f"joint_k{k}_with_event_ids.json"
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(final_docs, f, ensure_ascii=False, indent=2)
+        print(f"📁 {len(final_docs)} documents → {output_path}")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Répartit les tokens de chaque prompt généré entre ses sections :
+    rule_book (prompt principal) | demos (few-shot + séparateurs) | target
+pour chaque dossier <strategy>_k<k> de ner/generated_prompts/ et
+event/generated_prompts/events/, puis affiche distributions, prompts
+atypiques et part du total consommée par section.
+
+Usage :
+    python ner/analyze_prompt_tokens.py [racine ...] [--json rapport.json]
+"""
+
+import argparse
+import json
+import math
+from pathlib import Path
+from tqdm import tqdm
+
+from prompt_manifest import count_sweep_prompts, iter_sweep_prompts
+from token_accounting import get_counter
+
+# ── CONFIG ───────────────────────────────────────────────────────────────────
+MODEL = "gpt-4.1"
+DEFAULT_ROOTS = [Path("ner/generated_prompts"), Path("event/generated_prompts/events")]
+SECTIONS = ("rule_book", "demos", "target")
+SEPARATOR = "-" * 80
+DEMO_MARKER = 'Texte: "'
+N_OUTLIERS = 5
+
+COUNTER = get_counter(MODEL)
+
+# ── DÉCOUPAGE ────────────────────────────────────────────────────────────────
+def split_prompt(text: str) -> dict:
+    """
+    Le prompt a la forme  <règles>\\n\\n<démos séparées par des tirets>\\n\\n<tirets>\\n<cible>.
+    La cible suit le dernier séparateur ; les démos commencent au premier « Texte: ».
+    """
+    head, sep, target = text.rpartition(SEPARATOR)
+    if not sep:
+        return {"rule_book": text, "demos": "", "target": ""}
+    demo_start = head.find(DEMO_MARKER)
+    if demo_start == -1:
+        demo_start = len(head)
+    return {
+        "rule_book": head[:demo_start],
+        "demos": head[demo_start:] + sep,
+        "target": target,
+    }
+
+def count_sections(text: str) -> dict:
+    parts = split_prompt(text)
+    return dict(zip(SECTIONS, COUNTER.count_many([parts[name] for name in SECTIONS])))
+
+# ── STATISTIQUES ─────────────────────────────────────────────────────────────
+def percentile(sorted_values: list, q: float) -> int:
+    if not sorted_values:
+        return 0
+    rank = max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+def describe(values: list) -> dict:
+    ordered = sorted(values)
+    n = len(ordered)
+    return {
+        "sum": sum(ordered),
+        "mean": round(sum(ordered) / n, 1) if n else 0,
+        "p50": percentile(ordered, 50),
+        "p90": percentile(ordered, 90),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1] if ordered else 0,
+    }
+
+def analyze_folder(folder: Path) -> dict:
+    per_prompt = {}
+    for prompt_id, text in tqdm(iter_sweep_prompts(folder), total=count_sweep_prompts(folder),
+                                desc=f"🧮 {folder.name}"):
+        per_prompt[prompt_id] = count_sections(text)
+
+    totals = {pid: sum(c.values()) for pid, c in per_prompt.items()}
+    grand_total = sum(totals.values())
+    sections = {}
+    for name in SECTIONS:
+        stats = describe([c[name] for c in per_prompt.values()])
+        stats["share"] = round(stats["sum"] / grand_total, 4) if grand_total else 0
+        sections[name] = stats
+
+    # Atypiques : au-delà du p99 des totaux, les plus gros d'abord
+    total_stats = describe(list(totals.values()))
+    outliers = sorted((pid for pid, t in totals.items() if t > total_stats["p99"]),
+                      key=totals.get, reverse=True)[:N_OUTLIERS]
+
+    return {
+        "folder": str(folder),
+        "n_prompts": len(per_prompt),
+        "total": total_stats,
+        "sections": sections,
+        "outliers": [{"id": pid, **per_prompt[pid], "total": totals[pid]} for pid in outliers],
+    }
+
+def print_report(report: dict):
+    print(f"\n📂 {report['folder']} — {report['n_prompts']} prompts, "
+          f"{report['total']['sum']:,} tokens (moy. {report['total']['mean']}, "
+          f"p99 {report['total']['p99']}, max {report['total']['max']})")
+    print(f"   {'section':10} {'part':>6} {'moy.':>8} {'p50':>7} {'p90':>7} {'p99':>7} {'max':>7}")
+    for name, s in report["sections"].items():
+        print(f"   {name:10} {s['share']:>6.1%} {s['mean']:>8} {s['p50']:>7} "
+              f"{s['p90']:>7} {s['p99']:>7} {s['max']:>7}")
+    for o in report["outliers"]:
+        print(f"   ⚠️ {o['id']} : {o['total']} tokens "
+              f"(règles {o['rule_book']} | démos {o['demos']} | cible {o['target']})")
+
+# ── SCRIPT ───────────────────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("roots", nargs="*", type=Path, default=DEFAULT_ROOTS,
+                        help="dossiers contenant les sous-dossiers de prompts")
+    parser.add_argument("--json", type=Path, help="écrit le rapport complet en JSON")
+    args = parser.parse_args()
+
+    folders = [d for root in args.roots if root.is_dir()
+               for d in sorted(root.iterdir()) if d.is_dir()]
+    if not folders:
+        raise SystemExit("❌ Aucun dossier de prompts trouvé.")
+
+    reports = [analyze_folder(folder) for folder in folders]
+    for report in reports:
+        print_report(report)
+
+    if args.json:
+        args.json.write_text(json.dumps(reports, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n💾 Rapport écrit → {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Pré-filtre des segments qui ne contiennent probablement aucune entité.
+
+Étape locale entre text_to_segments.py (et rule_annotator.py) et
+generate_prompt_batches.py. Chaque segment reçoit un score à partir d'indices
+peu coûteux :
+  • formes d'entités de train.json retrouvées (automate d'Aho-Corasick) ;
+  • nom propre / sigle, chiffres, détecteurs de dates, maladies et agents
+    NRBCE de rule_book.py ;
+combinés en OU bruité (HEURISTIC_WEIGHTS) ou, avec USE_CLASSIFIER, par une
+petite régression logistique apprise sur les segments de train.json.
+Les segments sous le seuil sont inscrits au registre (segment_registry.py)
+avec une prédiction vide : aucun prompt ne leur est consacré.
+
+Le seuil est THRESHOLD, ou, si TARGET_RECALL est défini, le plus haut seuil
+qui garde cette part des segments annotés de train.json (gazetteer construit
+sur l'autre moitié des documents pour ne pas surestimer le rappel). Le
+rappel mesuré sur l'annotation de référence est écrit dans REPORT_PATH.
+"""
+
+import json
+import math
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from rule_book import DATE_RE, DISEASE_RE, NRBCE_RE, WORD_RE, has_proper_noun
+from segment_registry import save_stage
+from text_to_segments import split_text_with_entities
+
+# === Paramètres ===
+TRAIN_JSON_PATH = Path("datasets/train.json")
+SEGMENTS_PATH = Path("test_segments.json")
+REPORT_PATH = Path("ner/prefilter_report.json")
+STAGE = "prefilter"
+THRESHOLD = 0.3
+TARGET_RECALL = None        # ex. 0.99 : seuil calibré sur train.json
+USE_CLASSIFIER = False
+MIN_GAZETTEER_CHARS = 3     # formes plus courtes ignorées (« de », « la »…)
+
+FEATURES = ["gazetteer", "proper_noun", "digit", "date", "disease", "nrbce", "length"]
+HEURISTIC_WEIGHTS = {"gazetteer": 0.9, "proper_noun": 0.6, "digit": 0.4,
+                     "date": 0.3, "disease": 0.6, "nrbce": 0.4, "length": 0.0}
+
+# ── AHO-CORASICK ─────────────────────────────────────────────────────────────
+class AhoCorasick:
+    """Recherche simultanée de toutes les formes d'un gazetteer (mots entiers)"""
+
+    def __init__(self, words):
+        self.goto, self.fail, self.out = [{}], [0], [set()]
+        for word in words:
+            node = 0
+            for char in word:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(set())
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.out[node].add(len(word))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.out[child] |= self.out[self.fail[child]]
+
+    def find(self, text: str) -> list:
+        """[(début, fin)] des formes trouvées, limitées à des mots entiers"""
+        matches, node = [], 0
+        for i, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length in self.out[node]:
+                start, end = i + 1 - length, i + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+                    matches.append((start, end))
+        return matches
+
+def build_automaton(docs) -> AhoCorasick:
+    forms = {ent["text"].strip().lower() for doc in docs for ent in doc.get("entities", [])}
+    return AhoCorasick(sorted(f for f in forms if len(f) >= MIN_GAZETTEER_CHARS))
+
+# ── SCORE ────────────────────────────────────────────────────────────────────
+def features(text: str, automaton: AhoCorasick) -> list:
+    return [
+        float(bool(automaton.find(text.lower()))),
+        float(has_proper_noun(text)),
+        float(any(char.isdigit() for char in text)),
+        float(bool(DATE_RE.search(text))),
+        float(bool(DISEASE_RE.search(text))),
+        float(bool(NRBCE_RE.search(text))),
+        math.log1p(len(WORD_RE.findall(text))),
+    ]
+
+def heuristic_scores(X: np.ndarray) -> np.ndarray:
+    weights = np.array([HEURISTIC_WEIGHTS[name] for name in FEATURES])
+    return 1 - np.prod(1 - np.minimum(X, 1) * weights, axis=1)
+
+def train_classifier(X: np.ndarray, y: np.ndarray, epochs: int = 500, lr: float = 0.5, l2: float = 1e-3):
+    """Régression logistique (descente de gradient) → fonction de score"""
+    mean, std = X.mean(axis=0), X.std(axis=0) + 1e-9
+    Xn = np.hstack([(X - mean) / std, np.ones((len(X), 1))])
+    w = np.zeros(Xn.shape[1])
+    for _ in range(epochs):
+        p = 1 / (1 + np.exp(-Xn @ w))
+        w -= lr * (Xn.T @ (p - y) / len(y) + l2 * w)
+    return lambda Z: 1 / (1 + np.exp(-np.hstack([(Z - mean) / std, np.ones((len(Z), 1))]) @ w))
+
+def calibrate_threshold(scores: np.ndarray, y: np.ndarray, target_recall: float) -> float:
+    """Plus haut seuil qui garde au moins target_recall des segments annotés"""
+    positives = np.sort(scores[y == 1])[::-1]
+    if not len(positives):
+        return THRESHOLD
+    keep = max(math.ceil(target_recall * len(positives)), 1)
+    return float(positives[keep - 1])
+
+def recall_report(segments, kept: np.ndarray) -> dict:
+    """Rappel du filtre face à l'annotation de référence (segments et entités)"""
+    n_entities = np.array([len(seg.get("entities", [])) for seg in segments])
+    positive = n_entities > 0
+    return {
+        "segments_with_entities": int(positive.sum()),
+        "segment_recall": float(kept[positive].mean()) if positive.any() else None,
+        "entity_recall": float(n_entities[kept].sum() / n_entities.sum()) if n_entities.sum() else None,
+    }
+
+# === Exécution principale ===
+if __name__ == "__main__":
+    with open(TRAIN_JSON_PATH, "r", encoding="utf-8") as f:
+        train_docs = json.load(f)
+    with open(SEGMENTS_PATH, "r", encoding="utf-8") as f:
+        segments = json.load(f)
+
+    # Segments de train : gazetteer appris sur l'autre moitié des documents
+    folds = [train_docs[0::2], train_docs[1::2]]
+    train_segments, X_train = [], []
+    for held_out, other in ((0, 1), (1, 0)):
+        automaton = build_automaton(folds[other])
+        for i, doc in enumerate(folds[held_out]):
+            for seg in split_text_with_entities(doc, i):
+                train_segments.append(seg)
+                X_train.append(features(seg["text"], automaton))
+    X_train = np.array(X_train)
+    y_train = np.array([float(bool(seg["entities"])) for seg in train_segments])
+
+    automaton = build_automaton(train_docs)
+    X = np.array([features(seg["text"], automaton) for seg in segments])
+
+    score = train_classifier(X_train, y_train) if USE_CLASSIFIER else heuristic_scores
+    threshold = THRESHOLD
+    if TARGET_RECALL is not None:
+        threshold = calibrate_threshold(score(X_train), y_train, TARGET_RECALL)
+    kept_train = score(X_train) >= threshold
+    kept = score(X) >= threshold
+
+    added = save_stage(STAGE, {i: {"entities": []} for i in np.flatnonzero(~kept).tolist()}, segments)
+    report = {
+        "scorer": "classifier" if USE_CLASSIFIER else "heuristic",
+        "threshold": threshold,
+        "segments": len(segments),
+        "skipped": int((~kept).sum()),
+        "registered": added,
+        "train": recall_report(train_segments, kept_train),
+        "test": recall_report(segments, kept),
+    }
+    REPORT_PATH.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print(f"🧹 Seuil {threshold:.3f} ({report['scorer']}) : {report['skipped']}/{len(segments)} segments écartés "
+          f"({added} nouveaux au registre)")
+    for split in ("train", "test"):
+        r = report[split]
+        if r["segment_recall"] is not None:
+            print(f"🎯 Rappel {split} : segments {r['segment_recall']:.1%} | entités {r['entity_recall']:.1%}")
+    print(f"📝 Rapport : {REPORT_PATH}")
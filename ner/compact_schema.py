@@ -0,0 +1,43 @@
+"""
+Schéma de sortie NER compact :
+    {"e": [{"t": <texte>, "l": <label>}]}
+Clés courtes et `l` restreint (enum) aux labels listés dans main_prompt.txt,
+ce qui réduit les tokens générés et élimine les labels invalides.
+`expand_output` ramène la réponse au format habituel
+{"entities": [{"text": ..., "label": ...}]}.
+"""
+
+import re
+from pathlib import Path
+
+MAIN_PROMPT_PATH = Path("ner/prompt_elements/main_prompt.txt")
+LABEL_RE = re.compile(r"^- ([A-Z_]+) :", re.MULTILINE)
+
+COMPACT_SYSTEM_PROMPT = ('Tu es un assistant NER. Réponds uniquement avec '
+                         'un JSON du type : {"e":[{"t":<texte>,"l":<label>}]}')
+
+def load_labels(path: Path = MAIN_PROMPT_PATH) -> list:
+    """Labels valides, dans l'ordre où le prompt principal les définit"""
+    labels = LABEL_RE.findall(path.read_text(encoding="utf-8"))
+    return list(dict.fromkeys(labels))
+
+def build_compact_schema(labels: list) -> dict:
+    return {
+        "type": "object",
+        "properties": {"e": {
+            "type": "array",
+            "items": {"type": "object",
+                      "properties": {"t": {"type": "string"},
+                                     "l": {"type": "string", "enum": labels}},
+                      "required": ["t", "l"],
+                      "additionalProperties": False}}},
+        "required": ["e"],
+        "additionalProperties": False
+    }
+
+def expand_output(output: dict) -> dict:
+    """Convertit une réponse compacte au format {"entities": [...]} (sinon inchangée)"""
+    if "e" not in output:
+        return output
+    return {"entities": [{"text": ent["t"], "label": ent["l"]}
+                         for ent in output["e"]]}
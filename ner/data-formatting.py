@@ -1,6 +1,11 @@
 import json
 from pathlib import Path
 
+from demo_store import make_record, write_store
+from token_accounting import get_counter
+
+MODEL = "gpt-4.1"
+
 def load_json(path):
     with open(path, encoding='utf-8') as f:
         return json.load(f)
@@ -20,19 +25,24 @@ def prepare_prompt(example):
     return prompt
 
 def process_file(filepath):
-    data = load_json(filepath)
-    return [prepare_prompt(example) for example in data]
+    """Une entrée du magasin de démos par exemple (bloc rendu, labels, nb de tokens)"""
+    strategy = filepath.stem.replace("_train", "")
+    examples = load_json(filepath)
+    blocks = [prepare_prompt(example) + "\n" for example in examples]
+    n_tokens = get_counter(MODEL).count_many(blocks)
+    records = []
+    for i, (example, block, n) in enumerate(zip(examples, blocks, n_tokens)):
+        labels = [ent["label"] for ent in example.get("entities", [])]
+        records.append(make_record(f"{strategy}:{i}", block, labels, n))
+    return records
 
 if __name__ == "__main__":
     base_dir = Path("ner/demo_datasets")
     json_files = sorted(base_dir.glob("*.json"))
 
     for json_file in json_files:
-        prompts = process_file(json_file)
-        output_path = json_file.with_suffix(".txt")
-
-        with open(output_path, "w", encoding="utf-8") as f:
-            for prompt in prompts:
-                f.write(prompt + "\n" + "-" * 80 + "\n")
+        records = process_file(json_file)
+        output_path = json_file.with_suffix(".jsonl")
+        write_store(output_path, records)
 
-        print(f"✅ Prompts saved to {output_path}")
+        print(f"✅ {len(records)} démonstrations enregistrées → {output_path}")
@@ -0,0 +1,45 @@
+"""
+Déduplication exacte des segments (noms d'agence, mentions légales, titres
+repris à l'identique d'un document à l'autre).
+
+Étape locale à lancer après text_to_segments.py et les autres étapes de
+pré-annotation. Chaque segment dont le texte (sans blancs de bord, tel qu'il
+est envoyé dans le prompt) a déjà été vu est inscrit au registre
+(segment_registry.py) comme copie de sa première occurrence : un seul prompt
+par texte et par stratégie/k. transform_openai_predictions.py recopie la
+réponse de l'original sur chaque copie, alignée sur le texte de la copie ;
+reconstruct_predictions.py la replace ensuite dans son propre document.
+"""
+
+import json
+from collections import Counter
+from pathlib import Path
+
+from segment_registry import load_registry, save_stage
+
+# === Paramètres ===
+SEGMENTS_PATH = Path("test_segments.json")
+STAGE = "dedup"
+
+if __name__ == "__main__":
+    with open(SEGMENTS_PATH, "r", encoding="utf-8") as f:
+        segments = json.load(f)
+    # Segments déjà résolus par une autre étape : pas d'original à partager
+    others = {i for i, entry in load_registry(segments).items() if entry["stage"] != STAGE}
+
+    originals, copies = {}, {}
+    for i, segment in enumerate(segments):
+        if i in others:
+            continue
+        key = segment["text"].strip()
+        if key in originals:
+            copies[i] = {"copy_of": originals[key]}
+        else:
+            originals[key] = i
+
+    added = save_stage(STAGE, copies, segments)
+    print(f"🧬 {added} copie(s) exacte(s) sur {len(segments)} segments "
+          f"→ {len(originals)} prompts par stratégie/k")
+    repeated = Counter(segments[entry["copy_of"]]["text"].strip() for entry in copies.values())
+    for text, n in repeated.most_common(5):
+        print(f"   ↳ ×{n + 1} « {text[:60]} »")
@@ -1,11 +1,54 @@
+import hashlib
 import json
 from collections import Counter
 from pathlib import Path
 
+import numpy as np
+
+from minhash_lsh import BANDS, NUM_PERM, SEED, SHINGLE_SIZE, THRESHOLD, cluster_near_duplicates
+
+# Indices des démos gardées après dédoublonnage MinHash/LSH (voir remove_near_duplicates)
+NEAR_DUP_CACHE = Path("ner/cache/near_duplicates.json")
+
+# Nombre d'exemples conservés par stratégie
+# (= max(max(K_RANGE), MAX_DYNAMIC_K) de generate_prompt_batches.py)
+N_DEMOS = 16
+
 def load_data(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def remove_near_duplicates(data, source_path, cache_path, threshold=THRESHOLD):
+    """
+    Garde un représentant par cluster de quasi-doublons (MinHash/LSH) :
+    celui qui porte le plus d'entités. Les indices conservés sont mis en
+    cache et réutilisés tant que le fichier source et les paramètres MinHash/LSH
+    (seuil, permutations, bandes, graine, shingles) sont inchangés.
+    """
+    source_sha1 = hashlib.sha1(Path(source_path).read_bytes()).hexdigest()
+    params = {"threshold": threshold, "num_perm": NUM_PERM, "bands": BANDS,
+              "seed": SEED, "shingle_size": SHINGLE_SIZE}
+    cache_path = Path(cache_path)
+    if cache_path.exists():
+        cache = json.loads(cache_path.read_text(encoding="utf-8"))
+        if cache.get("source_sha1") == source_sha1 and cache.get("params") == params:
+            return [data[i] for i in cache["kept"]]
+
+    clusters = cluster_near_duplicates([item['text'] for item in data], threshold)
+    best = {}
+    for i, root in enumerate(clusters):
+        if root not in best or len(data[i]['entities']) > len(data[best[root]]['entities']):
+            best[root] = i
+    kept = sorted(best.values())
+
+    cache_path.write_text(json.dumps({
+        "source_sha1": source_sha1,
+        "params": params,
+        "kept": kept
+    }), encoding="utf-8")
+    print(f"🧹 Quasi-doublons : {len(data) - len(kept)} retirés, {len(kept)} exemples conservés.")
+    return [data[i] for i in kept]
+
 def count_entity_labels(data):
     """Retourne un Counter global pour tous les labels"""
     label_counter = Counter()
@@ -14,54 +57,69 @@ def count_entity_labels(data):
         label_counter.update(labels)
     return label_counter
 
-def score_instance(instance, global_counts):
-    """Calcule différents critères pour l'ordonnancement"""
-    labels = [ent['label'] for ent in instance['entities']]
-    unique_labels = set(labels)
-    text_len = len(instance['text'])
+def build_label_matrix(data, label_index):
+    """Matrice (n_instances × n_labels) du nombre d'entités par label"""
+    rows, cols = [], []
+    for i, item in enumerate(data):
+        for ent in item['entities']:
+            rows.append(i)
+            cols.append(label_index[ent['label']])
+
+    matrix = np.zeros((len(data), len(label_index)), dtype=np.int32)
+    rows = np.asarray(rows, dtype=np.intp)
+    cols = np.asarray(cols, dtype=np.intp)
+    np.add.at(matrix, (rows, cols), 1)
+    return matrix
+
+def compute_scores(data, global_counts):
+    """Calcule en une passe les critères d'ordonnancement de toutes les instances"""
+    labels = sorted(global_counts)
+    label_index = {label: j for j, label in enumerate(labels)}
+    counts = build_label_matrix(data, label_index)
+    present = counts > 0
+    text_len = np.array([len(item['text']) for item in data], dtype=np.float64)
 
     # Stratégie 1 : diversité de labels
-    label_diversity = len(unique_labels)
+    label_diversity = present.sum(axis=1)
 
     # Stratégie 2 : rareté inverse (on somme les 1/fréquence pour chaque label)
-    rarity_score = sum(1 / global_counts[label] for label in unique_labels)
+    inv_freq = 1.0 / np.array([global_counts[label] for label in labels], dtype=np.float64)
+    rarity_score = present @ inv_freq
 
     # Stratégie 3 : densité d'entités
-    density = len(labels) / text_len if text_len > 0 else 0
+    n_entities = counts.sum(axis=1)
+    density = np.divide(n_entities, text_len, out=np.zeros_like(text_len), where=text_len > 0)
 
     return {
-        "label_diversity": label_diversity,
-        "rarity_score": rarity_score,
-        "density": density
+        "diversity": label_diversity.astype(np.float64),
+        "rarity": rarity_score,
+        "density": density,
+        "combined": label_diversity * 2 + rarity_score * 3 + density,
     }
 
-def reorder_dataset(data, strategy, global_counts):
-    scored = []
-
-    for item in data:
-        scores = score_instance(item, global_counts)
-        item['_scores'] = scores
-        scored.append(item)
-
-    # Tri selon la stratégie choisie
-    if strategy == "diversity":
-        scored.sort(key=lambda x: x['_scores']['label_diversity'], reverse=True)
-    elif strategy == "rarity":
-        scored.sort(key=lambda x: x['_scores']['rarity_score'], reverse=True)
-    elif strategy == "density":
-        scored.sort(key=lambda x: x['_scores']['density'], reverse=True)
-    elif strategy == "combined":
-        scored.sort(key=lambda x: (
-            x['_scores']['label_diversity'] * 2 +
-            x['_scores']['rarity_score'] * 3 +
-            x['_scores']['density']
-        ), reverse=True)
-
-    # Nettoyage
-    for item in scored:
-        item.pop('_scores', None)
-
-    return scored
+def top_k_indices(scores, k):
+    """
+    Indices des k meilleurs scores (ordre décroissant), sans tri complet.
+    Les ex-aequo gardent l'ordre d'origine, comme le tri stable précédent.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Seuil = k-ième meilleur score, obtenu par sélection partielle O(n)
+    threshold = np.partition(scores, n - k)[n - k]
+    above = np.flatnonzero(scores > threshold)
+    ties = np.flatnonzero(scores == threshold)[:k - len(above)]
+    head = np.concatenate([above, ties])
+
+    # Tri (stable) de la tête uniquement
+    order = np.lexsort((head, -scores[head]))
+    return head[order]
+
+def reorder_dataset(data, strategy, scores, k=N_DEMOS):
+    """Renvoie les k meilleures instances pour la stratégie, sans modifier `data`"""
+    return [data[i] for i in top_k_indices(scores[strategy], k)]
 
 def save_data(data, path):
     with open(path, "w", encoding="utf-8") as f:
@@ -76,10 +134,15 @@ if __name__ == "__main__":
     data = load_data(train_path)
     global_counts = count_entity_labels(data)
 
+    # Un seul représentant par cluster de quasi-doublons avant classement
+    NEAR_DUP_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    data = remove_near_duplicates(data, train_path, NEAR_DUP_CACHE)
+    scores = compute_scores(data, global_counts)
+
     strategies = ["diversity", "density"]
 
     for strategy in strategies:
-        ordered_data = reorder_dataset(data, strategy, global_counts)
+        ordered_data = reorder_dataset(data, strategy, scores)
         output_path = output_dir / f"{strategy}_train.json"
         save_data(ordered_data, output_path)
         print(f"✅ Fichier '{output_path.name}' créé avec {len(ordered_data)} exemples.")
@@ -0,0 +1,62 @@
+"""
+Sélection des démonstrations événements par profil de labels d'entités.
+
+Chaque document d'entraînement est décrit par le multiensemble des labels
+de ses entités ; chaque document cible par celui des entités prédites par
+le pipeline NER (ner/reconstructed_outputs*/…_reconstructed.json). Les k
+démos les plus proches (cosinus, comptes amortis par log1p) sont retenues
+pour chaque cible, toutes cibles d'un coup (un produit matriciel). Sans
+prédiction pour une cible, la sélection par défaut est conservée.
+Les événements d'une cible n'étant connus qu'après l'inférence, le profil
+ne comporte pas d'attributs d'événement : seuls les labels d'entités sont
+comparables entre démos et cibles.
+Le classement est déterministe (ex-aequo départagés par l'ordre du magasin).
+Partagé par les générateurs de prompts de event/ et event-cot/.
+"""
+
+import json
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from demo_preparation import top_k_indices
+
+def label_profile(entities) -> Counter:
+    return Counter(ent["label"] for ent in entities)
+
+def load_predicted_profiles(path: Path, n_docs: int) -> list:
+    """Profils des documents cibles (doc_<i>), vides si non prédits"""
+    with open(path, "r", encoding="utf-8") as f:
+        predictions = {doc["doc_id"]: doc.get("entities", []) for doc in json.load(f)}
+    return [label_profile(predictions.get(f"doc_{i}", [])) for i in range(n_docs)]
+
+def profile_matrix(profiles, label_index) -> np.ndarray:
+    """Matrice (documents × labels) normalisée ligne à ligne"""
+    matrix = np.zeros((len(profiles), len(label_index)))
+    for row, profile in enumerate(profiles):
+        for label, count in profile.items():
+            if label in label_index:
+                matrix[row, label_index[label]] = np.log1p(count)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+class DemoIndex:
+    """Index des profils de labels des démonstrations du magasin"""
+
+    def __init__(self, demo_ids, train_profiles):
+        self.demo_ids = list(demo_ids)
+        labels = sorted({label for profile in train_profiles for label in profile})
+        self.label_index = {label: j for j, label in enumerate(labels)}
+        self.matrix = profile_matrix(train_profiles, self.label_index)
+
+    def select(self, target_profiles, k, default_ids):
+        """k démos par cible, les plus proches d'abord"""
+        similarities = profile_matrix(target_profiles, self.label_index) @ self.matrix.T
+        selections = []
+        for scores in similarities:
+            if not any(scores):
+                selections.append(list(default_ids))
+                continue
+            selections.append([self.demo_ids[j] for j in top_k_indices(scores, k)])
+        return selections
@@ -0,0 +1,27 @@
+"""
+Magasin de démonstrations few-shot (JSONL, une démo par ligne, dans l'ordre
+de la stratégie) :
+    {"id": "density:0", "block": <démo rendue>, "labels": [...], "n_tokens": 123}
+Partagé par le pipeline NER (data-formatting.py → generate_prompt_batches.py)
+et le pipeline événements (generate_event_prompts.py). Lire k démos ne
+parcourt que les k premières lignes.
+"""
+
+import json
+from itertools import islice
+from pathlib import Path
+
+def make_record(demo_id: str, block: str, labels, n_tokens: int) -> dict:
+    return {"id": demo_id, "block": block, "labels": sorted(set(labels)), "n_tokens": n_tokens}
+
+def write_store(path: Path, records):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            json.dump(record, f, ensure_ascii=False)
+            f.write("\n")
+
+def load_demos(path: Path, k: int = None) -> list:
+    """Les k premières démonstrations du magasin (toutes si k est None)"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in islice(f, k) if line.strip()]
@@ -0,0 +1,169 @@
+"""
+Inventaire d'entités pour les prompts événements.
+
+Les entités (prédites par le NER pour les cibles, de référence pour les
+démos) sont listées dans le prompt avec une poignée numérique [n] ; le
+modèle renvoie ces poignées au lieu de recopier le texte, avec un schéma
+dont l'enum est limité aux poignées du document. Une poignée regroupe les
+mentions de même texte et même label, et se résout en liste d'ids par
+simple indexation : plus d'appariement textuel ni de valeur perdue.
+Les ids n'ont de sens que pour le fichier de prédictions NER qui a servi à
+construire les poignées : son chemin est enregistré avec elles et la
+reconstruction n'utilise que ce fichier.
+Partagé par les pipelines event/ et event-cot/.
+"""
+
+import json
+from pathlib import Path
+
+INVENTORY_NAME = "inventories.json"      # {"predictions": <chemin>, "inventories": {prompt_id: [[ids], ...]}}
+ATTRIBUTES = ["central_element", "associated_element"]
+INVENTORY_SYSTEM_PROMPT = (
+    "Tu es un assistant d'extraction d'événements. Les entités du texte sont "
+    "listées avec un numéro [n] ; pour chaque attribut, renvoie le numéro de "
+    "l'entité. Tu dois retourner un JSON de la forme : "
+    "{\"events\": [[{\"attribute\": ..., \"entity\": n}, ...], ...]}"
+)
+JOINT_SYSTEM_PROMPT = (
+    "Tu es un assistant d'extraction d'entités et d'événements. Liste les "
+    "entités du texte, puis les événements en désignant chaque attribut par "
+    "l'indice (à partir de 0) de l'entité dans ta liste. Tu dois retourner un "
+    "JSON de la forme : {\"entities\": [{\"text\": ..., \"label\": ...}, ...], "
+    "\"events\": [[{\"attribute\": ..., \"entity\": n}, ...], ...]}"
+)
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def build_inventory(entities) -> list:
+    """Poignées [{"text", "label", "ids"}] dans l'ordre d'apparition"""
+    handles = {}
+    for ent in sorted(entities, key=lambda e: min(e.get("start") or [0])):
+        key = (normalize(ent["text"]), ent["label"])
+        if key not in handles:
+            handles[key] = {"text": ent["text"].strip(), "label": ent["label"], "ids": []}
+        handles[key]["ids"].append(ent.get("id"))
+    return list(handles.values())
+
+def format_inventory(inventory) -> str:
+    return "\n".join(f"  [{h}] {item['text']} ({item['label']})"
+                     for h, item in enumerate(inventory))
+
+def handle_of(inventory, text: str):
+    """Poignée d'un texte d'entité (None si absent de l'inventaire)"""
+    key = normalize(text)
+    return next((h for h, item in enumerate(inventory) if normalize(item["text"]) == key), None)
+
+def format_events(events, inventory=None) -> str:
+    """
+    Événements d'une démo (« Event i » puis un attribut par ligne, première
+    occurrence) ; avec un inventaire, la poignée remplace le texte. Un
+    attribut dont l'occurrence n'est pas dans l'inventaire est retiré de la
+    démo, avec un avertissement.
+    """
+    formatted = ""
+    for i, event in enumerate(events, 1):
+        lines = []
+        for attr in event:
+            occurrences = attr.get("occurrences", [])
+            first_occ = occurrences[0].strip() if occurrences else "[EMPTY]"
+            if inventory is not None:
+                handle = handle_of(inventory, first_occ)
+                if handle is not None:
+                    lines.append(f"  - {attr['attribute'].removeprefix('evt:')}: [{handle}]")
+                else:
+                    print(f"⚠️ Démo : {attr['attribute']} « {first_occ} » absent de l'inventaire, attribut retiré")
+                continue
+            lines.append(f"  - {attr['attribute']}: {first_occ}")
+        formatted += f"  Event {i}:\n" + "\n".join(lines) + "\n"
+    return formatted
+
+def build_inventory_schema(n_handles: int, explanation: bool = False) -> dict:
+    """Schéma strict : attribut et poignée contraints par enum"""
+    properties = {
+        "attribute": {"type": "string", "enum": ATTRIBUTES},
+        "entity": {"type": "integer", "enum": list(range(n_handles))},
+    }
+    if explanation:
+        properties["explanation"] = {"type": "string"}
+    return {
+        "type": "object",
+        "properties": {
+            "events": {
+                "type": "array",
+                "items": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": properties,
+                        "required": list(properties),
+                        "additionalProperties": False
+                    }
+                }
+            }
+        },
+        "required": ["events"],
+        "additionalProperties": False
+    }
+
+def build_joint_schema(labels) -> dict:
+    """Schéma strict du mode conjoint : entités (labels en enum) + événements par indice"""
+    events = build_inventory_schema(0)["properties"]["events"]
+    events["items"]["items"]["properties"]["entity"] = {"type": "integer"}
+    return {
+        "type": "object",
+        "properties": {
+            # Les entités d'abord : les événements y font référence
+            "entities": {
+                "type": "array",
+                "items": {"type": "object",
+                          "properties": {"text": {"type": "string"},
+                                         "label": {"type": "string", "enum": list(labels)}},
+                          "required": ["text", "label"],
+                          "additionalProperties": False}
+            },
+            "events": events
+        },
+        "required": ["entities", "events"],
+        "additionalProperties": False
+    }
+
+def save_inventories(output_dir: Path, inventories: dict, predictions_path: Path):
+    (output_dir / INVENTORY_NAME).write_text(
+        json.dumps({"predictions": str(predictions_path), "inventories": inventories}), encoding="utf-8")
+
+def read_inventory_file(output_dir: Path):
+    path = output_dir / INVENTORY_NAME
+    if not path.exists():
+        return None
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if "predictions" not in data:
+        raise SystemExit(f"❌ {path} ne précise pas le fichier de prédictions NER utilisé : "
+                         "régénérer les prompts avec generate_event_prompts.py")
+    return data
+
+def load_inventories(output_dir: Path):
+    """{prompt_id: [[ids], ...]} du dossier, None s'il n'est pas en mode inventaire"""
+    data = read_inventory_file(output_dir)
+    return None if data is None else data["inventories"]
+
+def inventory_predictions(output_dir: Path):
+    """Fichier de prédictions NER dont viennent les ids des poignées (None hors mode inventaire)"""
+    data = read_inventory_file(output_dir)
+    return None if data is None else Path(data["predictions"])
+
+def matches_inventory(output_dir: Path, ent_file: Path) -> bool:
+    """Les poignées du dossier (s'il y en a) ont-elles été construites sur ent_file ?"""
+    source = inventory_predictions(output_dir)
+    return source is None or source.resolve() == Path(ent_file).resolve()
+
+def resolve_events(output: dict, handle_ids: list) -> list:
+    """Événements du modèle (poignées) → [{"attribute": "evt:…", "occurrences": [ids]}]"""
+    events = []
+    for event in output.get("events", []):
+        block = [{"attribute": "evt:" + attr["attribute"], "occurrences": handle_ids[attr["entity"]]}
+                 for attr in event
+                 if isinstance(attr.get("entity"), int) and 0 <= attr["entity"] < len(handle_ids)]
+        if block:
+            events.append(block)
+    return events
@@ -1,61 +1,156 @@
 import json
 from pathlib import Path
 
+from demo_store import load_demos
+from prompt_manifest import (MANIFEST_NAME, SEPARATOR, content_hash, export_txt,
+                             format_target_prompt, generate_prompt, prompt_hash,
+                             template_id, update_manifest, write_parts)
+from rule_book import RuleBook
+from segment_registry import load_registry
+from token_accounting import get_counter
+
 # === Paramètres ===
 MAIN_PROMPT_PATH = "ner/prompt_elements/main_prompt.txt"
-TRAIN_DIR = Path("ner/demo_datasets")
+TRAIN_DIR = Path("ner/demo_datasets")        # magasins <strategy>_train.jsonl
 TARGET_JSON_PATH = "test_segments.json"
 OUTPUT_DIR = Path("ner/generated_prompts")
 K_RANGE = [4, 6, 8]
 
+# Mode "k dynamique" : si TOKEN_BUDGET est défini, chaque prompt reçoit autant
+# de démonstrations (dans l'ordre de la stratégie) que le budget le permet,
+# au lieu d'un k fixe. Les prompts sont alors écrits dans <strategy>_budget<N>/.
+TOKEN_BUDGET = None        # ex. 6_000 tokens par requête
+MAX_DYNAMIC_K = 16         # plafond de démonstrations en mode dynamique
+MODEL = "gpt-4.1"
+
+# Élagage du livre de règles : seules les sections de main_prompt.txt utiles
+# au segment (détecteurs locaux) sont envoyées. Dossiers suffixés "_pruned".
+PRUNE_RULE_BOOK = False
+TRAIN_JSON_PATH = "datasets/train.json"      # gazetteer des détecteurs
+
+# Les prompts sont décrits par un manifest.jsonl par dossier (rendu à la volée
+# par prepare_batches.py) ; EXPORT_TXT réécrit aussi un prompt_XXX.txt par prompt.
+# Chaque prompt est identifié par le hash de ses entrées : seuls les contenus
+# nouveaux d'une génération à l'autre sont listés dans <dossier>/changes.json
+# (un prompt simplement décalé par l'ajout d'un segment garde sa réponse).
+EXPORT_TXT = False
+
 # === Fonctions ===
 def load_main_prompt():
     with open(MAIN_PROMPT_PATH, "r", encoding="utf-8") as f:
         return f.read().strip()
 
-def load_fewshot_examples(path, k):
-    with open(path, "r", encoding="utf-8") as f:
-        content = f.read().strip()
-        examples = content.split("-" * 80)
-        return examples[:k]
-
-def format_target_prompt(example):
-    text = example["text"].strip()
-    return f'Texte: "{text}"\nEntités:'
 
-def generate_prompt(main_prompt, fewshot_block, target_text):
-    return f"{main_prompt}\n\n{fewshot_block}\n\n{'-'*80}\n{target_text}"
+def fit_fewshot_to_budget(base_tokens, demo_tokens, target_tokens, budget):
+    """
+    Nombre de démonstrations (prises dans l'ordre) qui tiennent dans le budget.
+    Le coût d'un prompt est approché par la somme des coûts de ses parties
+    (prompt principal + séparateurs, démonstrations, cible).
+    """
+    remaining = budget - base_tokens - target_tokens
+    k = 0
+    for cost in demo_tokens:
+        if cost > remaining:
+            break
+        remaining -= cost
+        k += 1
+    return k
 
 def load_target_data():
     with open(TARGET_JSON_PATH, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def save_prompts(all_prompts, strategy_k):
+def save_prompts(entries, strategy_k):
+    """Met à jour le manifeste du dossier et signale les prompts modifiés"""
     out_dir = OUTPUT_DIR / strategy_k
-    out_dir.mkdir(parents=True, exist_ok=True)
-    for i, prompt in enumerate(all_prompts):
-        output_file = out_dir / f"prompt_{i:03}.txt"
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(prompt)
-    print(f"✅ {len(all_prompts)} prompts saved in '{out_dir}/'.")
+    changes = update_manifest(out_dir, entries)
+    print(f"✅ {len(entries)} prompts in '{out_dir}/{MANIFEST_NAME}' "
+          f"— {len(changes['changed'])} modifié(s), {changes['moved']} décalé(s), "
+          f"{len(changes['removed'])} supprimé(s).")
+    if 0 < len(changes["changed"]) <= 20:
+        print("   ↳ " + ", ".join(changes["changed"]))
+    return out_dir
+
+def build_entries(template_ids, demo_ids_per_target, demo_hashes, target_data, resolved=()):
+    """Une entrée par segment, sauf ceux déjà résolus localement (registre)"""
+    entries = []
+    for i, (tid, demo_ids, example) in enumerate(zip(template_ids, demo_ids_per_target, target_data)):
+        if i in resolved:
+            continue
+        entries.append({
+            "id": f"prompt_{i:03}",
+            "template": tid,
+            "demos": demo_ids,
+            "segment": i,
+            "hash": prompt_hash(tid, [demo_hashes[d] for d in demo_ids], example["text"])
+        })
+    return entries
+
+def generate_budgeted_entries(main_prompts, demos, target_data, counter):
+    """Prompts à k variable : autant de démonstrations que TOKEN_BUDGET le permet"""
+    # Coûts fixes comptés une seule fois par variante du prompt principal (et
+    # mis en cache sur disque) ; le coût de chaque démo vient du magasin.
+    separator_tokens = counter.count(SEPARATOR + "\n\n")
+    demo_tokens = [d["n_tokens"] + separator_tokens for d in demos[:MAX_DYNAMIC_K]]
+    base_tokens = counter.count_many([generate_prompt(p, "\n", "") for p in main_prompts])
+    target_tokens = counter.count_many([format_target_prompt(ex) for ex in target_data])
+
+    selected, ks = [], []
+    for base, target in zip(base_tokens, target_tokens):
+        k = fit_fewshot_to_budget(base, demo_tokens, target, TOKEN_BUDGET)
+        selected.append([d["id"] for d in demos[:k]])
+        ks.append(k)
+
+    if ks:
+        print(f"📏 k dynamique : min={min(ks)} | moy={sum(ks) / len(ks):.1f} | max={max(ks)}")
+    return selected
 
 # === Exécution principale ===
 if __name__ == "__main__":
     main_prompt = load_main_prompt()
     target_data = load_target_data()
+    counter = get_counter(MODEL) if TOKEN_BUDGET else None
+    resolved = load_registry(target_data)
+    if resolved:
+        print(f"🧾 {len(resolved)}/{len(target_data)} segments résolus localement : pas de prompt")
 
-    for train_file in TRAIN_DIR.glob("*_train.txt"):
+    # Prompt principal propre à chaque cible (identique partout sans élagage)
+    suffix = ""
+    main_prompts = [main_prompt] * len(target_data)
+    if PRUNE_RULE_BOOK:
+        rule_book = RuleBook.load(MAIN_PROMPT_PATH, TRAIN_JSON_PATH)
+        main_prompts = [rule_book.prompt_for(example["text"]) for example in target_data]
+        suffix = "_pruned"
+        ratio = sum(map(len, main_prompts)) / max(len(main_prompts) * len(main_prompt), 1)
+        print(f"✂️ Livre de règles élagué : {ratio:.0%} de la taille d'origine en moyenne")
+
+    templates = {template_id(text): text for text in set(main_prompts)}
+    template_ids = [template_id(text) for text in main_prompts]
+    demo_blocks, demo_hashes, written = {}, {}, []
+    n_demos = max(K_RANGE + ([MAX_DYNAMIC_K] if TOKEN_BUDGET else []))
+
+    for train_file in TRAIN_DIR.glob("*_train.jsonl"):
         strategy = train_file.stem.replace("_train", "")
+        demos = load_demos(train_file, n_demos)
+        demo_ids = [d["id"] for d in demos]
+        demo_blocks.update((d["id"], d["block"]) for d in demos)
+        demo_hashes.update((d["id"], content_hash(d["block"])) for d in demos)
+
+        if TOKEN_BUDGET:
+            selected = generate_budgeted_entries(main_prompts, demos, target_data, counter)
+            entries = build_entries(template_ids, selected, demo_hashes, target_data, resolved)
+            written.append(save_prompts(entries, f"{strategy}_budget{TOKEN_BUDGET}{suffix}"))
+            continue
 
         for k in K_RANGE:
-            fewshot_examples = load_fewshot_examples(train_file, k)
-            fewshot_block = "\n" + ("-" * 80 + "\n").join(fewshot_examples)
+            selected = [demo_ids[:k]] * len(target_data)
+            strategy_k = f"{strategy}_k{k}{suffix}"
+            entries = build_entries(template_ids, selected, demo_hashes, target_data, resolved)
+            written.append(save_prompts(entries, strategy_k))
 
-            all_prompts = []
-            for example in target_data:
-                target = format_target_prompt(example)
-                prompt = generate_prompt(main_prompt, fewshot_block, target)
-                all_prompts.append(prompt)
+    # Textes partagés, écrits une seule fois pour tous les dossiers
+    write_parts(OUTPUT_DIR, templates, demo_blocks, TARGET_JSON_PATH)
 
-            strategy_k = f"{strategy}_k{k}"
-            save_prompts(all_prompts, strategy_k)
+    if EXPORT_TXT:
+        for out_dir in written:
+            print(f"📝 {export_txt(out_dir)} prompts .txt exportés dans '{out_dir}/'.")
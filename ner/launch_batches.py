@@ -9,7 +9,6 @@ import json
 import sys
 import time
 from pathlib import Path
-import tiktoken
 from openai import OpenAI
 
 # ── CONFIG ───────────────────────────────────────────────────────────────────
@@ -18,11 +17,6 @@ POLL_DELAY_SECONDS = 240
 OUTPUT_DIR = Path("ner/openai_outputs_batches_3")  # même dossier que précédemment
 
 # ── INIT ─────────────────────────────────────────────────────────────────────
-try:
-    ENCODING = tiktoken.encoding_for_model(MODEL)
-except KeyError:
-    ENCODING = tiktoken.get_encoding("o200k_base")
-
 client = OpenAI()
 TERMINAL = {"completed", "failed", "cancelled", "expired"}
 
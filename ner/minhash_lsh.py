@@ -0,0 +1,87 @@
+"""
+MinHash + LSH : regroupe les textes quasi identiques (dépêches reprises,
+signatures répétées, lignes « AFP »…) en clusters.
+
+Usage :
+    clusters = cluster_near_duplicates(texts)   # clusters[i] = représentant de i
+"""
+
+import hashlib
+import re
+
+import numpy as np
+
+# ── PARAMÈTRES ───────────────────────────────────────────────────────────────
+NUM_PERM = 128          # taille de la signature MinHash
+BANDS = 16              # 16 bandes × 8 lignes → seuil LSH ≈ 0.7
+SHINGLE_SIZE = 5        # n-grammes de caractères
+THRESHOLD = 0.8         # Jaccard estimé minimal pour fusionner deux textes
+SEED = 13
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WS_RE = re.compile(r"\s+")
+
+# ── MINHASH ──────────────────────────────────────────────────────────────────
+def normalize(text: str) -> str:
+    return _WS_RE.sub(" ", text.lower()).strip()
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    text = normalize(text)
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def _hash32(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+
+def _permutations(num_perm: int, seed: int):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+def minhash_signatures(texts, num_perm: int = NUM_PERM, seed: int = SEED) -> np.ndarray:
+    """Matrice (n_textes × num_perm) des signatures MinHash"""
+    a, b = _permutations(num_perm, seed)
+    signatures = np.full((len(texts), num_perm), _MAX_HASH, dtype=np.uint64)
+    for i, text in enumerate(texts):
+        hv = np.fromiter((_hash32(s) for s in shingles(text)), dtype=np.uint64)
+        # a < 2^31 et hv < 2^32 : le produit tient sur 64 bits sans débordement
+        phv = (hv[:, None] * a + b) % _MERSENNE_PRIME & _MAX_HASH
+        signatures[i] = phv.min(axis=0)
+    return signatures
+
+# ── LSH + UNION-FIND ─────────────────────────────────────────────────────────
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def cluster_near_duplicates(texts, threshold: float = THRESHOLD,
+                            num_perm: int = NUM_PERM, bands: int = BANDS) -> list:
+    """
+    Renvoie pour chaque texte l'indice du représentant de son cluster
+    (le plus petit indice du cluster). Chaque texte est comparé à tous ceux
+    qui partagent déjà un de ses seaux LSH ; une paire candidate n'est
+    fusionnée (union-find) que si son Jaccard estimé dépasse `threshold`.
+    """
+    signatures = minhash_signatures(texts, num_perm)
+    rows = num_perm // bands
+    parent = list(range(len(texts)))
+
+    for band in range(bands):
+        buckets = {}
+        chunk = signatures[:, band * rows:(band + 1) * rows]
+        for i in range(len(texts)):
+            members = buckets.setdefault(chunk[i].tobytes(), [])
+            for j in members:
+                rj, ri = _find(parent, j), _find(parent, i)
+                if rj == ri:
+                    continue
+                if np.mean(signatures[j] == signatures[i]) >= threshold:
+                    parent[max(rj, ri)] = min(rj, ri)
+            members.append(i)
+
+    return [_find(parent, i) for i in range(len(texts))]
@@ -0,0 +1,199 @@
+"""
+Propagation des prédictions entre articles quasi identiques (dépêches
+reprises avec de petites retouches).
+
+Étape locale à lancer après text_to_segments.py. Les documents de test.json
+sont regroupés par MinHash/LSH (minhash_lsh.py) ; dans chaque cluster, le
+plus petit indice sert de représentant et passe seul par l'inférence. Pour
+chaque autre membre, un alignement caractère par caractère (difflib) avec le
+représentant donne les zones modifiées :
+  • si une zone modifiée porte un indice d'entité (chiffre, nom propre,
+    date, maladie, agent NRBCE), le membre est signalé et garde une
+    inférence normale ;
+  • sinon ses segments sont inscrits au registre (segment_registry.py,
+    étape "near_dup") : aucun prompt NER. reconstruct_predictions.py lui
+    reporte les entités du représentant (offsets transposés par
+    l'alignement, mêmes ids) et les scripts de reconstruction des
+    événements lui recopient les événements du représentant.
+Une entité du représentant qui tombe dans une zone modifiée ne peut pas
+être reportée : le membre est alors signalé a posteriori (flag_members) et
+ses segments sortent du registre, pour repasser par l'inférence au prochain
+generate_prompt_batches.py (ONLY_CHANGED suffit à ne batcher qu'eux).
+Clusters écrits dans CLUSTERS_PATH :
+    {"docs": n, "members": {"<i>": {"rep": r, "flagged": bool}}}
+"""
+
+import bisect
+import difflib
+import json
+from pathlib import Path
+
+from minhash_lsh import THRESHOLD, cluster_near_duplicates
+from rule_book import ACRONYM_RE, CAPITALIZED_RE, DATE_RE, DISEASE_RE, NRBCE_RE
+from segment_registry import release, save_stage
+
+# === Paramètres ===
+TEST_JSON_PATH = Path("datasets/test.json")
+SEGMENTS_PATH = Path("test_segments.json")
+CLUSTERS_PATH = Path("ner/doc_clusters.json")
+STAGE = "near_dup"
+DOC_THRESHOLD = THRESHOLD      # Jaccard estimé minimal entre deux articles
+
+# ── ALIGNEMENT ───────────────────────────────────────────────────────────────
+class OffsetMap:
+    """Correspondance des offsets d'un texte source vers un texte cible"""
+
+    def __init__(self, source: str, target: str):
+        matcher = difflib.SequenceMatcher(None, source, target, autojunk=False)
+        self.blocks = [(i, j, n) for i, j, n in matcher.get_matching_blocks() if n]
+        self.starts = [i for i, _, _ in self.blocks]
+        self.source, self.target = source, target
+
+    def map(self, pos: int):
+        """Offset cible du caractère `pos` de la source (None s'il a été modifié)"""
+        k = bisect.bisect_right(self.starts, pos) - 1
+        if k < 0:
+            return None
+        i, j, n = self.blocks[k]
+        return j + pos - i if pos < i + n else None
+
+    def changed_regions(self):
+        """Zones modifiées : [(texte, début, fin)] côté source puis côté cible"""
+        regions, i_prev, j_prev = [], 0, 0
+        for i, j, n in self.blocks + [(len(self.source), len(self.target), 0)]:
+            if i > i_prev:
+                regions.append((self.source, i_prev, i))
+            if j > j_prev:
+                regions.append((self.target, j_prev, j))
+            i_prev, j_prev = i + n, j + n
+        return regions
+
+def word_span(text: str, start: int, end: int) -> str:
+    """Zone élargie aux mots qu'elle coupe"""
+    while start > 0 and text[start - 1].isalnum():
+        start -= 1
+    while end < len(text) and text[end].isalnum():
+        end += 1
+    return text[start:end]
+
+def has_entity_cue(text: str) -> bool:
+    return bool(DATE_RE.search(text) or DISEASE_RE.search(text) or NRBCE_RE.search(text)
+                or CAPITALIZED_RE.search(text) or ACRONYM_RE.search(text))
+
+def needs_inference(rep_text: str, member_text: str) -> bool:
+    offsets = OffsetMap(rep_text, member_text)
+    return any(has_entity_cue(word_span(text, s, e)) for text, s, e in offsets.changed_regions())
+
+# ── PROPAGATION ──────────────────────────────────────────────────────────────
+def load_clusters(n_docs: int, path: Path = CLUSTERS_PATH) -> dict:
+    """{indice de membre propagé: indice du représentant} (vide si absent ou périmé)"""
+    if not path.exists():
+        return {}
+    clusters = json.loads(path.read_text(encoding="utf-8"))
+    if clusters.get("docs") != n_docs:
+        print(f"⚠️ {path} ignoré : {clusters.get('docs')} documents enregistrés, {n_docs} attendus.")
+        return {}
+    return {int(i): member["rep"] for i, member in clusters["members"].items() if not member["flagged"]}
+
+def carry_entities(rep_doc: dict, member_text: str):
+    """Entités du représentant transposées sur le membre → (entités, nb non reportées)"""
+    offsets = OffsetMap(rep_doc["text"], member_text)
+    carried, dropped = [], 0
+    for ent in rep_doc["entities"]:
+        starts = [offsets.map(s) for s in ent["start"]]
+        lasts = [offsets.map(e - 1) for e in ent["end"]]
+        # Chaque fragment doit être retrouvé à l'identique
+        if None in starts or None in lasts or any(
+                member_text[s:l + 1] != rep_doc["text"][s0:e0]
+                for s, l, s0, e0 in zip(starts, lasts, ent["start"], ent["end"])):
+            dropped += 1
+            continue
+        carried.append({**ent, "start": starts, "end": [l + 1 for l in lasts]})
+    return carried, dropped
+
+def flag_members(flagged: set, path: Path = CLUSTERS_PATH):
+    """
+    Signale des membres dans CLUSTERS_PATH et retire leurs segments du
+    registre : ils repasseront par l'inférence.
+    Renvoie (nb de membres nouvellement signalés, nb de segments rendus).
+    """
+    clusters = json.loads(path.read_text(encoding="utf-8"))
+    new = {m for m in flagged if not clusters["members"][str(m)]["flagged"]}
+    if not new:
+        return 0, 0
+    for member in new:
+        clusters["members"][str(member)]["flagged"] = True
+    path.write_text(json.dumps(clusters, indent=2), encoding="utf-8")
+    with open(SEGMENTS_PATH, "r", encoding="utf-8") as f:
+        segments = json.load(f)
+    doc_ids = {f"doc_{member}" for member in new}
+    return len(new), release([i for i, seg in enumerate(segments) if seg["doc_id"] in doc_ids], segments, STAGE)
+
+def propagate_entities(docs: list, members: dict):
+    """
+    Remplace en place les entités des membres par celles de leur
+    représentant. Un membre dont des entités n'ont pas pu être reportées
+    garde les autres pour ce run, puis est signalé pour une nouvelle inférence.
+    """
+    by_id = {doc["doc_id"]: doc for doc in docs}
+    flagged = set()
+    for member, rep in members.items():
+        member_doc, rep_doc = by_id.get(f"doc_{member}"), by_id.get(f"doc_{rep}")
+        if not member_doc or not rep_doc:
+            continue
+        member_doc["entities"], dropped = carry_entities(rep_doc, member_doc["text"])
+        if dropped:
+            print(f"⚠️ doc_{member} : {dropped} entité(s) de doc_{rep} dans une zone modifiée, non reportée(s)")
+            flagged.add(member)
+    n_new, released = flag_members(flagged) if flagged else (0, 0)
+    if n_new:
+        print(f"🚩 {n_new} document(s) signalé(s) dans {CLUSTERS_PATH}, {released} segment(s) "
+              "rendu(s) à l'inférence : relancer generate_prompt_batches.py (ONLY_CHANGED) puis la suite")
+
+def propagate_events(final_docs: list, doc_map: dict, members: dict) -> int:
+    """
+    Ajoute aux documents finals les membres absents, avec les événements de
+    leur représentant (ids conservés par propagate_entities). Renvoie le
+    nombre de documents ajoutés.
+    """
+    by_id = {doc["doc_id"]: doc for doc in final_docs}
+    added = 0
+    for member, rep in sorted(members.items()):
+        doc, rep_doc = doc_map.get(f"doc_{member}"), by_id.get(f"doc_{rep}")
+        if not doc or not rep_doc or doc["doc_id"] in by_id:
+            continue
+        ids = {ent["id"] for ent in doc["entities"]}
+        events = []
+        for event in rep_doc["events"]:
+            block = [{**attr, "occurrences": [o for o in attr["occurrences"] if o in ids]}
+                     for attr in event]
+            block = [attr for attr in block if attr["occurrences"]]
+            if block:
+                events.append(block)
+        final_docs.append({"doc_id": doc["doc_id"], "text": doc["text"],
+                           "entities": doc["entities"], "events": events})
+        added += 1
+    return added
+
+# === Exécution principale ===
+if __name__ == "__main__":
+    with open(TEST_JSON_PATH, "r", encoding="utf-8") as f:
+        texts = [doc["text"] for doc in json.load(f)]
+    with open(SEGMENTS_PATH, "r", encoding="utf-8") as f:
+        segments = json.load(f)
+
+    reps = cluster_near_duplicates(texts, DOC_THRESHOLD)
+    members = {i: {"rep": rep, "flagged": needs_inference(texts[rep], texts[i])}
+               for i, rep in enumerate(reps) if rep != i}
+    CLUSTERS_PATH.write_text(json.dumps({"docs": len(texts),
+                                         "members": {str(i): m for i, m in members.items()}}, indent=2),
+                             encoding="utf-8")
+
+    propagated = {f"doc_{i}": m["rep"] for i, m in members.items() if not m["flagged"]}
+    added = save_stage(STAGE, {i: {"doc_of": propagated[seg["doc_id"]]}
+                               for i, seg in enumerate(segments) if seg["doc_id"] in propagated},
+                       segments)
+    n_flagged = sum(m["flagged"] for m in members.values())
+    print(f"📰 {len(members)} quasi-doublon(s) dans {len(set(reps))} clusters / {len(texts)} documents : "
+          f"{len(propagated)} propagé(s), {n_flagged} signalé(s) pour inférence")
+    print(f"🧾 {added} segment(s) sans prompt → {CLUSTERS_PATH}")
@@ -0,0 +1,46 @@
+"""
+Filtre NER en amont de l'extraction d'événements.
+
+Un événement s'organise autour d'un élément central (maladie infectieuse
+ou toxinique — le botulisme est NON_INF_DISEASE —, pathogène, toxine, agent
+NR/C/E). Un document dont la sortie NER
+reconstruite ne contient aucune entité de ces labels ne peut donner que des
+événements vides ou parasites : aucun prompt n'est généré pour lui, et les
+scripts de reconstruction lui attribuent directement une liste vide.
+Les documents absents des prédictions sont conservés (prudence).
+Partagé par les pipelines event/ et event-cot/.
+"""
+
+import json
+from pathlib import Path
+
+CENTRAL_LABELS = {
+    "INF_DISEASE", "NON_INF_DISEASE", "PATHOGEN", "DIS_REF_TO_PATH", "PATH_REF_TO_DIS",
+    "RADIOISOTOPE", "TOXIC_C_AGENT", "BIO_TOXIN", "EXPLOSIVE",
+}
+GATED_NAME = "gated.json"      # {"docs": [indices des documents écartés]}
+
+def has_central_candidate(entities) -> bool:
+    return any(ent["label"] in CENTRAL_LABELS for ent in entities)
+
+def gate_documents(predictions_path: Path, n_docs: int) -> list:
+    """Indices des documents prédits sans aucun élément central candidat"""
+    with open(predictions_path, "r", encoding="utf-8") as f:
+        predicted = {doc["doc_id"]: doc.get("entities", []) for doc in json.load(f)}
+    return [i for i in range(n_docs)
+            if f"doc_{i}" in predicted and not has_central_candidate(predicted[f"doc_{i}"])]
+
+def save_gated(output_dir: Path, doc_indices):
+    """Écrit la liste des documents écartés (supprime celle d'un run précédent si vide)"""
+    path = output_dir / GATED_NAME
+    if not doc_indices:
+        path.unlink(missing_ok=True)
+        return
+    path.write_text(json.dumps({"docs": sorted(doc_indices)}), encoding="utf-8")
+
+def load_gated(output_dir: Path) -> list:
+    """Indices écartés lors de la génération (liste vide sans filtre)"""
+    path = output_dir / GATED_NAME
+    if not path.exists():
+        return []
+    return json.loads(path.read_text(encoding="utf-8"))["docs"]
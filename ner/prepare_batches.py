@@ -8,22 +8,26 @@ Ne crée PAS les batchs : chaque lot reste prêt à être lancé.
 import json
 from pathlib import Path
 from tqdm import tqdm
-import tiktoken
 from openai import OpenAI
 
+from compact_schema import (COMPACT_SYSTEM_PROMPT, build_compact_schema,
+                            load_labels)
+from prompt_manifest import (count_sweep_prompts, iter_sweep_prompts,
+                             load_changed_ids)
+from token_accounting import get_counter
+
 # ── CONFIG ────────────────────────────────────────────────────────────────────
 MODEL = "gpt-4.1"
 TOKEN_LIMIT_PER_BATCH = 1_200_000   # marge
 PROMPT_ROOT_DIR = Path("ner/generated_prompts")
 OUTPUT_DIR = Path("ner/openai_outputs_batches_3")
 BATCH_INPUT_DIR = OUTPUT_DIR / "batch_inputs"
+COMPACT_SCHEMA = False              # sortie {"e":[{"t","l"}]} + labels en enum
+ONLY_CHANGED = False                # ne batcher que les prompts listés dans changes.json
+ESTIMATE_ONLY = False               # estimation calibrée (+ marge) au lieu du comptage exact
 
 # ── INIT ─────────────────────────────────────────────────────────────────────
-try:
-    ENCODING = tiktoken.encoding_for_model(MODEL)
-except KeyError:
-    ENCODING = tiktoken.get_encoding("o200k_base")
-
+COUNTER = get_counter(MODEL)
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 BATCH_INPUT_DIR.mkdir(parents=True, exist_ok=True)
 client = OpenAI()
@@ -41,11 +45,15 @@ NER_SCHEMA = {
     "required": ["entities"],
     "additionalProperties": False
 }
+SYSTEM_PROMPT = ('Tu es un assistant NER. Réponds uniquement avec '
+                 'un JSON du type : '
+                 '{"entities":[{"text":...,"label":...}]}')
 
-# ── UTILS ────────────────────────────────────────────────────────────────────
-def count_tokens(text: str) -> int:
-    return len(ENCODING.encode(text))
+if COMPACT_SCHEMA:
+    NER_SCHEMA = build_compact_schema(load_labels())
+    SYSTEM_PROMPT = COMPACT_SYSTEM_PROMPT
 
+# ── UTILS ────────────────────────────────────────────────────────────────────
 def build_batch_request(prompt_text: str, prompt_id: str) -> dict:
     return {
         "custom_id": prompt_id,
@@ -54,10 +62,7 @@ def build_batch_request(prompt_text: str, prompt_id: str) -> dict:
         "body": {
             "model": MODEL,
             "input": [
-                {"role": "system",
-                 "content": ('Tu es un assistant NER. Réponds uniquement avec '
-                             'un JSON du type : '
-                             '{"entities":[{"text":...,"label":...}]}')},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt_text}
             ],
             "text": {"format": {"type": "json_schema",
@@ -70,14 +75,17 @@ def build_batch_request(prompt_text: str, prompt_id: str) -> dict:
 # ── TRAITEMENT ───────────────────────────────────────────────────────────────
 def prepare_one_strategy(strategy_dir: Path):
     strategy = strategy_dir.name
-    prompts  = sorted(strategy_dir.glob("prompt_*.txt"))
-    print(f"\n📂 {strategy}: {len(prompts)} prompts trouvés")
+    only_ids = load_changed_ids(strategy_dir) if ONLY_CHANGED else None
+    n_prompts = count_sweep_prompts(strategy_dir, only_ids)
+    print(f"\n📂 {strategy}: {n_prompts} prompts trouvés")
+    if not n_prompts:
+        return
 
+    # Prompts rendus à la volée depuis le manifeste (ou lus depuis les .txt)
     batches, cur_batch, token_sum = [], [], 0
-    for pf in tqdm(prompts, desc=f"Découpage {strategy}"):
-        txt   = pf.read_text(encoding="utf-8")
-        req   = build_batch_request(txt, pf.stem)
-        tokens = count_tokens(txt)
+    prompts = COUNTER.iter_counted(iter_sweep_prompts(strategy_dir, only_ids), ESTIMATE_ONLY)
+    for prompt_id, txt, tokens in tqdm(prompts, total=n_prompts, desc=f"Découpage {strategy}"):
+        req   = build_batch_request(txt, prompt_id)
         if token_sum + tokens > TOKEN_LIMIT_PER_BATCH:
             batches.append(cur_batch)
             cur_batch, token_sum = [], 0
@@ -0,0 +1,221 @@
+"""
+Manifeste de prompts : au lieu d'écrire un .txt par prompt, chaque dossier
+<strategy>_k<k>/ contient un manifest.jsonl (une ligne par prompt) :
+    {"id": "prompt_000", "template": <id>, "demos": [<id>, ...], "segment": 0}
+Les textes partagés (prompts principaux, démonstrations) sont stockés une
+seule fois dans <racine>/parts.json ; les prompts sont rendus à la volée.
+
+Chaque entrée porte aussi un "hash" de ses entrées (version du prompt
+principal, contenu des démonstrations, texte cible). Les custom_id sont
+positionnels (insérer un segment décale tous les suivants) : le delta est
+donc calculé sur les hash. Un prompt dont le contenu existait déjà sous un
+autre custom_id n'est pas modifié — sa réponse est réétiquetée dans
+<RESULTS_DIR>/<dossier>_outputs.jsonl — et seuls les contenus réellement
+nouveaux sont listés dans changes.json, ce qui permet de ne re-tokeniser /
+re-batcher / relancer que ce delta. Le delta s'ajoute à celui qui attend
+encore sa réponse (une régénération avant le batch ne perd rien) et les
+réponses dont le contenu a disparu sont retirées.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+MANIFEST_NAME = "manifest.jsonl"
+PARTS_NAME = "parts.json"
+CHANGES_NAME = "changes.json"
+RESULTS_DIR = Path("ner/batch_results")     # <dossier>_outputs.jsonl (retriever.py)
+SEPARATOR = "-" * 80
+
+# ── FORMAT DES PROMPTS ───────────────────────────────────────────────────────
+def format_target_prompt(example):
+    text = example["text"].strip()
+    return f'Texte: "{text}"\nEntités:'
+
+def format_fewshot_block(blocks):
+    """Démonstrations (blocs du magasin de démos) séparées par des tirets"""
+    return "\n" + (SEPARATOR + "\n\n").join(blocks)
+
+def generate_prompt(main_prompt, fewshot_block, target_text):
+    return f"{main_prompt}\n\n{fewshot_block}\n\n{'-'*80}\n{target_text}"
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def template_id(text: str) -> str:
+    return content_hash(text)[:12]
+
+def prompt_hash(template: str, demo_hashes: list, target_text: str) -> str:
+    """Identifiant de contenu d'un prompt : change dès qu'une de ses entrées change"""
+    return content_hash(json.dumps([template, demo_hashes, target_text], ensure_ascii=False))
+
+# ── ÉCRITURE ─────────────────────────────────────────────────────────────────
+def write_parts(root: Path, templates: dict, demos: dict, segments_path: str):
+    """Ajoute prompts principaux et démonstrations au parts.json de la racine"""
+    root.mkdir(parents=True, exist_ok=True)
+    path = root / PARTS_NAME
+    parts = {"templates": {}, "demos": {}}
+    if path.exists():
+        parts = json.loads(path.read_text(encoding="utf-8"))
+    parts["templates"].update(templates)
+    parts["demos"].update(demos)
+    parts["segments_path"] = str(segments_path)
+    path.write_text(json.dumps(parts, ensure_ascii=False), encoding="utf-8")
+
+def write_manifest(sweep_dir: Path, entries: list):
+    sweep_dir.mkdir(parents=True, exist_ok=True)
+    with open(sweep_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        for entry in entries:
+            json.dump(entry, f, ensure_ascii=False)
+            f.write("\n")
+
+def remap_by_hash(previous: dict, current: dict) -> dict:
+    """
+    {ancien custom_id: [nouveaux custom_id]} pour les contenus (hash) déjà
+    présents à la génération précédente, à la même place ou décalés.
+    """
+    first_id = {}
+    for prompt_id, h in previous.items():
+        first_id.setdefault(h, prompt_id)
+    moves = {}
+    for prompt_id, h in current.items():
+        source = prompt_id if previous.get(prompt_id) == h else first_id.get(h)
+        if source is not None:
+            moves.setdefault(source, []).append(prompt_id)
+    return moves
+
+def relabel_outputs(outputs_path: Path, moves: dict, known_ids: set) -> set:
+    """
+    Réétiquette les réponses de outputs_path : la réponse d'un ancien
+    custom_id passe aux custom_id qui portent désormais son contenu (moves),
+    celles dont le contenu a disparu sont retirées. Les custom_id inconnus
+    de la génération précédente sont laissés tels quels.
+    Renvoie les custom_id qui y gardent une réponse (à jour).
+    """
+    if not outputs_path.exists():
+        return set()
+    entries = [json.loads(l) for l in outputs_path.read_text(encoding="utf-8").splitlines() if l.strip()]
+    kept = []
+    for e in entries:
+        targets = moves.get(e.get("id"), []) if e.get("id") in known_ids else [e.get("id")]
+        kept.extend({**e, "id": t} for t in targets)
+    if kept != entries:
+        with open(outputs_path, "w", encoding="utf-8") as f:
+            for e in kept:
+                json.dump(e, f, ensure_ascii=False)
+                f.write("\n")
+        stale = sum(1 for e in entries if e.get("id") in known_ids and e.get("id") not in moves)
+        print(f"🔀 Réponses réétiquetées dans {outputs_path} ({stale} périmée(s) retirée(s))")
+    return {e.get("id") for e in kept}
+
+def merge_changes(sweep_dir: Path, previous: dict, current: dict, results_dir: Path = RESULTS_DIR) -> dict:
+    """
+    Compare les hash {custom_id: hash} de la génération précédente et de
+    celle-ci, réétiquette les réponses des contenus décalés, puis ajoute le
+    delta à celui de changes.json. Un contenu modifié lors d'une génération
+    précédente reste en attente (sous son nouveau custom_id) tant qu'il n'a
+    pas de réponse. Renvoie le delta de cette génération :
+    {"changed": [...], "removed": [...], "moved": n}.
+    """
+    moves = remap_by_hash(previous, current)
+    known = {t for targets in moves.values() for t in targets}
+    changes = {
+        "changed": [prompt_id for prompt_id in current if prompt_id not in known],
+        "removed": sorted(set(previous) - set(current)),
+        "moved": sum(1 for source, targets in moves.items() for t in targets if t != source),
+    }
+
+    path = sweep_dir / CHANGES_NAME
+    pending = {"changed": [], "removed": []}
+    if path.exists():
+        pending = json.loads(path.read_text(encoding="utf-8"))
+    still_pending = {t for prompt_id in pending["changed"] for t in moves.get(prompt_id, [])}
+
+    answered = relabel_outputs(results_dir / f"{sweep_dir.name}_outputs.jsonl", moves, set(previous))
+    merged = {
+        "changed": sorted((still_pending - answered) | set(changes["changed"])),
+        "removed": sorted((set(pending["removed"]) | set(changes["removed"])) - set(current)),
+    }
+    path.write_text(json.dumps(merged, indent=2), encoding="utf-8")
+    return changes
+
+def update_manifest(sweep_dir: Path, entries: list) -> dict:
+    """
+    Compare les hash aux précédents, réécrit le manifeste s'il a changé et
+    fusionne le delta dans changes.json (voir merge_changes).
+    Renvoie le delta de cette génération.
+    """
+    sweep_dir.mkdir(parents=True, exist_ok=True)
+    previous = {}
+    if has_manifest(sweep_dir):
+        previous = {e["id"]: e.get("hash") for e in iter_manifest(sweep_dir)}
+
+    current = {e["id"]: e["hash"] for e in entries}
+    if current != previous:
+        write_manifest(sweep_dir, entries)
+    return merge_changes(sweep_dir, previous, current)
+
+# ── LECTURE / RENDU ──────────────────────────────────────────────────────────
+def has_manifest(sweep_dir: Path) -> bool:
+    return (sweep_dir / MANIFEST_NAME).exists()
+
+def load_changed_ids(sweep_dir: Path) -> set:
+    """custom_id modifiés et encore sans réponse (None si inconnu)"""
+    path = sweep_dir / CHANGES_NAME
+    if not path.exists():
+        return None
+    return set(json.loads(path.read_text(encoding="utf-8"))["changed"])
+
+def iter_manifest(sweep_dir: Path):
+    with open(sweep_dir / MANIFEST_NAME, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+class PromptRenderer:
+    """Charge parts.json et les segments une fois, puis rend les prompts à la demande"""
+
+    def __init__(self, root: Path):
+        parts = json.loads((root / PARTS_NAME).read_text(encoding="utf-8"))
+        self.templates = parts["templates"]
+        self.demos = parts["demos"]
+        with open(parts["segments_path"], "r", encoding="utf-8") as f:
+            self.segments = json.load(f)
+
+    def render(self, entry: dict) -> str:
+        fewshot_block = format_fewshot_block([self.demos[d] for d in entry["demos"]])
+        target = format_target_prompt(self.segments[entry["segment"]])
+        return generate_prompt(self.templates[entry["template"]], fewshot_block, target)
+
+    def iter_prompts(self, sweep_dir: Path, only_ids: set = None):
+        """(custom_id, texte du prompt) en flux, dans l'ordre du manifeste"""
+        for entry in iter_manifest(sweep_dir):
+            if only_ids is None or entry["id"] in only_ids:
+                yield entry["id"], self.render(entry)
+
+def iter_sweep_prompts(sweep_dir: Path, only_ids: set = None):
+    """
+    Prompts d'un dossier : rendus depuis le manifeste, sinon lus depuis
+    prompt_*.txt. `only_ids` restreint le flux à certains custom_id.
+    """
+    if has_manifest(sweep_dir):
+        yield from PromptRenderer(sweep_dir.parent).iter_prompts(sweep_dir, only_ids)
+        return
+    for pf in sorted(sweep_dir.glob("prompt_*.txt")):
+        if only_ids is None or pf.stem in only_ids:
+            yield pf.stem, pf.read_text(encoding="utf-8")
+
+def count_sweep_prompts(sweep_dir: Path, only_ids: set = None) -> int:
+    if has_manifest(sweep_dir):
+        ids = [e["id"] for e in iter_manifest(sweep_dir)]
+    else:
+        ids = [pf.stem for pf in sweep_dir.glob("prompt_*.txt")]
+    return sum(1 for pid in ids if only_ids is None or pid in only_ids)
+
+def export_txt(sweep_dir: Path) -> int:
+    """Réécrit l'ancienne arborescence (un prompt_XXX.txt par prompt) pour débogage"""
+    n = 0
+    for prompt_id, prompt in iter_sweep_prompts(sweep_dir):
+        (sweep_dir / f"{prompt_id}.txt").write_text(prompt, encoding="utf-8")
+        n += 1
+    return n
@@ -2,15 +2,30 @@ import json
 from pathlib import Path
 from collections import defaultdict
 
+from near_duplicate_docs import load_clusters, propagate_entities
+
 # === Chemins d'entrée ===
 INPUT_DIR = Path("ner/aligned_outputs_3")
 OUTPUT_DIR = Path("ner/reconstructed_outputs_2")
 ORIGINAL_DOC_PATH = Path("datasets/test.json")
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-# Charger les documents originaux pour retrouver les textes complets
-with open(ORIGINAL_DOC_PATH, "r", encoding="utf-8") as f:
-    original_docs = {f"doc_{i}": doc for i, doc in enumerate(json.load(f))}
+def stitch_overlaps(entities, owners):
+    """
+    Fenêtres qui se recouvrent (text_to_segments.py, MAX_SEGMENT_TOKENS) :
+    une entité trouvée dans deux fenêtres n'est gardée qu'une fois, et une
+    entité coupée au bord d'une fenêtre (contenue dans une entité de même
+    label d'une autre fenêtre) s'efface devant la plus longue.
+    """
+    order = sorted(range(len(entities)), key=lambda k: (entities[k]["start"][0], -entities[k]["end"][-1]))
+    kept = []
+    for k in order:
+        ent = entities[k]
+        if any(owners[j] != owners[k] and entities[j]["label"] == ent["label"]
+               and entities[j]["start"][0] <= ent["start"][0] and ent["end"][-1] <= entities[j]["end"][-1]
+               for j in kept):
+            continue
+        kept.append(k)
+    return [entities[k] for k in sorted(kept)]
 
 def recompose_predictions_with_alignment(segmented_data):
     docs = defaultdict(list)
@@ -30,18 +45,20 @@ def recompose_predictions_with_alignment(segmented_data):
         # print(f"Ordered Segments: {segments_sorted}")
 
         current_offset = 0
-        entities = []
+        entities, owners, overlapping = [], [], False
 
-        for segment in segments_sorted:
+        for n, segment in enumerate(segments_sorted):
             seg_text = segment["text"]
             # print("***********")
             # print(f"Orignial text: {original_text}")
             # print(f"Segmented text: {seg_text}")
             # print(f"current_offset: {current_offset}")
-            found_at = original_text.find(seg_text, current_offset)
+            # Offset global enregistré par text_to_segments.py, sinon recherche
+            found_at = segment.get("start", original_text.find(seg_text, current_offset))
             # print(f"Found at: {found_at}")
             if found_at == -1:
                 raise ValueError(f"⚠️ Segment introuvable dans le texte original :\n{seg_text[:50]}...")
+            overlapping = overlapping or found_at < current_offset
 
             # Recalibrer les entités avec les bons offsets globaux
             for ent in segment.get("entities", []):
@@ -53,9 +70,13 @@ def recompose_predictions_with_alignment(segmented_data):
                     "id": ent["id"]
                 }
                 entities.append(new_ent)
+                owners.append(n)
 
             current_offset = found_at + len(seg_text)
 
+        if overlapping:
+            entities = stitch_overlaps(entities, owners)
+
         reconstructed.append({
             "doc_id": doc_id,
             "text": original_text,
@@ -65,14 +86,27 @@ def recompose_predictions_with_alignment(segmented_data):
     return reconstructed
 
 # === Traitement ===
-for json_file in sorted(INPUT_DIR.glob("*_with_offsets.json")):
-    with open(json_file, "r", encoding="utf-8") as f:
-        segmented_data = json.load(f)
+if __name__ == "__main__":
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Charger les documents originaux pour retrouver les textes complets
+    with open(ORIGINAL_DOC_PATH, "r", encoding="utf-8") as f:
+        original_docs = {f"doc_{i}": doc for i, doc in enumerate(json.load(f))}
+
+    near_duplicates = load_clusters(len(original_docs))
+    if near_duplicates:
+        print(f"📰 {len(near_duplicates)} document(s) repris d'un article quasi identique")
+
+    for json_file in sorted(INPUT_DIR.glob("*_with_offsets.json")):
+        with open(json_file, "r", encoding="utf-8") as f:
+            segmented_data = json.load(f)
 
-    output = recompose_predictions_with_alignment(segmented_data)
-    output_path = OUTPUT_DIR / json_file.name.replace("_with_offsets.json", "_reconstructed.json")
+        output = recompose_predictions_with_alignment(segmented_data)
+        # Articles quasi identiques sans inférence : entités du représentant
+        propagate_entities(output, near_duplicates)
+        output_path = OUTPUT_DIR / json_file.name.replace("_with_offsets.json", "_reconstructed.json")
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
 
-    print(f"✅ Fichier reconstruit : {output_path}")
+        print(f"✅ Fichier reconstruit : {output_path}")
@@ -16,6 +16,8 @@ import time
 from pathlib import Path
 from openai import OpenAI
 
+from compact_schema import expand_output
+
 # ── PARAMÈTRES ───────────────────────────────────────────────────────────────
 BASE_DIR           = Path("ner")                        # racine de vos données
 BATCH_DIR          = BASE_DIR / "openai_outputs_batches_3"  # même que précédemment
@@ -54,6 +56,7 @@ def wait_for_batch(batch_id: str):
 def parse_record(record: dict):
     """
     Extrait (prompt_id, output|error) du format Batch v1
+    (les réponses au schéma compact sont ramenées à {"entities": [...]})
     """
     pid = record.get("custom_id")
     body = record.get("response", {}).get("body")
@@ -62,7 +65,7 @@ def parse_record(record: dict):
 
     try:
         txt = body["output"][0]["content"][0]["text"]
-        parsed = json.loads(txt)
+        parsed = expand_output(json.loads(txt))   # schéma compact → format habituel
         return pid, {"output": parsed}
     except Exception as e:
         return pid, {"error": f"parse_error: {e}"}
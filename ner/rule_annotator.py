@@ -0,0 +1,125 @@
+"""
+Pré-annotation déterministe des segments triviaux (sources, auteurs, dates).
+
+Étape locale entre text_to_segments.py et generate_prompt_batches.py. Un
+segment est résolu sans appel au LLM quand il est entièrement couvert :
+  • par le gazetteer : lignes de train.json identiques (aux blancs près),
+    annotées de la même façon dans au moins MIN_SHARE des cas ;
+  • par une règle (ligne de date, signature « Par Prénom Nom », sigle
+    d'agence seul) : le label est celui que train.json donne le plus souvent
+    aux lignes de même forme, et la règle est désactivée si cet accord reste
+    sous MIN_SHARE (une date isolée en tête d'article peut être DOC_DATE).
+Seuls les labels de RULE_LABELS sont produits. Les segments résolus sont
+écrits dans le registre de segment_registry.py.
+"""
+
+import json
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from rule_book import DAYS, MONTHS
+from segment_registry import save_stage
+from text_to_segments import split_text_with_entities
+
+# === Paramètres ===
+TRAIN_JSON_PATH = Path("datasets/train.json")
+SEGMENTS_PATH = Path("test_segments.json")
+STAGE = "rules"
+RULE_LABELS = {"DOC_SOURCE", "DOC_AUTHOR", "DOC_DATE", "ABS_DATE", "REL_DATE"}
+MIN_SHARE = 0.9     # accord minimal observé sur train.json
+MIN_COUNT = 2       # occurrences minimales dans train.json
+
+NAME = r"[A-ZÀ-Ý][\w'’-]+"
+RULES = {
+    "date": re.compile(
+        rf"^((?:(?:{DAYS})\s+)?\d{{1,2}}(?:er)?\s+(?:{MONTHS})\s+\d{{4}}|\d{{1,2}}/\d{{1,2}}/\d{{4}})$",
+        re.IGNORECASE),
+    "byline": re.compile(rf"^(?i:par|by)\s+({NAME}(?:\s+{NAME}){{1,3}})$"),
+    "source": re.compile(r"^\(?([A-Z]{2,6})\)?$"),
+}
+
+def normalize_line(text: str) -> str:
+    return " ".join(text.split())
+
+def segment_signature(segment) -> tuple:
+    """((texte, label), …) des entités du segment, dans l'ordre du texte"""
+    entities = sorted(segment["entities"], key=lambda ent: ent["start"][0])
+    return tuple((ent["text"], ent["label"]) for ent in entities)
+
+def majority(counter: Counter):
+    """(valeur majoritaire, part) ou (None, 0) si trop peu d'occurrences"""
+    value, n = counter.most_common(1)[0]
+    if n < MIN_COUNT:
+        return None, 0
+    return value, n / sum(counter.values())
+
+class RuleAnnotator:
+    def __init__(self, gazetteer: dict, rule_labels: dict):
+        self.gazetteer = gazetteer        # {ligne: ((texte, label), …)}
+        self.rule_labels = rule_labels    # {nom de règle: label}
+
+    @classmethod
+    def fit(cls, train_segments):
+        by_line, by_rule = defaultdict(Counter), defaultdict(Counter)
+        for segment in train_segments:
+            line = normalize_line(segment["text"])
+            signature = segment_signature(segment)
+            by_line[line][signature] += 1
+            for name, rule in RULES.items():
+                m = rule.match(line)
+                if m:
+                    # Accord : une seule entité, exactement le texte capturé
+                    agrees = len(signature) == 1 and signature[0][0] == m.group(1)
+                    by_rule[name][signature[0][1] if agrees else None] += 1
+
+        gazetteer = {}
+        for line, signatures in by_line.items():
+            signature, share = majority(signatures)
+            if signature and share >= MIN_SHARE and all(label in RULE_LABELS for _, label in signature):
+                gazetteer[line] = signature
+        rule_labels = {}
+        for name, labels in by_rule.items():
+            label, share = majority(labels)
+            if label in RULE_LABELS and share >= MIN_SHARE:
+                rule_labels[name] = label
+        return cls(gazetteer, rule_labels)
+
+    def annotate(self, text: str):
+        """(source, [(texte, label)]) si le segment est entièrement résolu, sinon None"""
+        line = normalize_line(text)
+        if line in self.gazetteer:
+            return "gazetteer", list(self.gazetteer[line])
+        for name, label in self.rule_labels.items():
+            m = RULES[name].match(line)
+            if m:
+                return name, [(m.group(1), label)]
+        return None
+
+if __name__ == "__main__":
+    with open(TRAIN_JSON_PATH, "r", encoding="utf-8") as f:
+        train_segments = [seg for i, doc in enumerate(json.load(f))
+                          for seg in split_text_with_entities(doc, i)]
+    with open(SEGMENTS_PATH, "r", encoding="utf-8") as f:
+        segments = json.load(f)
+
+    annotator = RuleAnnotator.fit(train_segments)
+    print(f"📚 Gazetteer : {len(annotator.gazetteer)} lignes | règles actives : "
+          + (", ".join(f"{name}→{label}" for name, label in annotator.rule_labels.items()) or "aucune"))
+
+    resolved, sources, agreed, has_gold = {}, Counter(), 0, False
+    for i, segment in enumerate(segments):
+        has_gold = has_gold or bool(segment.get("entities"))
+        result = annotator.annotate(segment["text"])
+        if result is None:
+            continue
+        source, entities = result
+        resolved[i] = {"entities": [{"text": text, "label": label} for text, label in entities]}
+        sources[source] += 1
+        agreed += sorted(entities) == sorted(segment_signature(segment))
+
+    added = save_stage(STAGE, resolved, segments)
+    print(f"🧾 {added}/{len(segments)} segments résolus sans LLM ("
+          + ", ".join(f"{source}: {n}" for source, n in sources.most_common()) + ")")
+    if has_gold and resolved:
+        print(f"🎯 Accord avec l'annotation de référence : {agreed}/{len(resolved)} segments résolus")
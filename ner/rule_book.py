@@ -0,0 +1,160 @@
+"""
+Élagage du livre de règles NER (main_prompt.txt) selon le segment.
+
+Le prompt principal est découpé en :
+  • un préfixe commun (tâche + règles générales), toujours identique ;
+  • les sections [1]…[6] (une par famille de labels) ;
+  • le bloc final « LA PHASE D'ANNOTATION ».
+Des détecteurs locaux peu coûteux (chiffres / mois, gazetteer issu de
+train.json, casse, mots-clés) décident quelles sections envoyer pour un
+segment donné. Sans aucun indice (ligne de liaison, formule creuse), seul un
+noyau minimal est envoyé : FALLBACK_SECTIONS (maladies, entités en minuscules
+que les détecteurs peuvent manquer, et entités discontinues qui les
+accompagnent comme ailleurs la section 2), au lieu du livre complet.
+"""
+
+import json
+import re
+from pathlib import Path
+
+MAIN_PROMPT_PATH = Path("ner/prompt_elements/main_prompt.txt")
+TRAIN_JSON_PATH = Path("datasets/train.json")
+
+SECTION_RE = re.compile(r"^\[(\d+)\] ", re.MULTILINE)
+TAIL_RE = re.compile(r"^-+\nLA PHASE D'ANNOTATION", re.MULTILINE)
+LABEL_RE = re.compile(r"^- ([A-Z_]+) :", re.MULTILINE)
+WORD_RE = re.compile(r"\w+(?:[-'’]\w+)*")
+MAX_GAZETTEER_WORDS = 6
+FALLBACK_SECTIONS = {2, 6}  # sections envoyées sans aucun indice (None : livre complet)
+
+# ── DÉTECTEURS ───────────────────────────────────────────────────────────────
+MONTHS = ("janvier|février|fevrier|mars|avril|mai|juin|juillet|août|aout|"
+          "septembre|octobre|novembre|décembre|decembre")
+DAYS = "lundi|mardi|mercredi|jeudi|vendredi|samedi|dimanche"
+DATE_RE = re.compile(
+    rf"\d|\b(?:{MONTHS}|{DAYS}|hier|aujourd'hui|demain|veille|lendemain|"
+    r"semaines?|mois|ans?|années?|siècles?|jours?|depuis|dernier|dernière|"
+    r"prochain|prochaine|récemment|actuellement|début|fin|mi-\w+)\b",
+    re.IGNORECASE)
+DISEASE_RE = re.compile(
+    r"virus|viral|bactéri|maladie|épidém|pandém|endém|infect|fièvre|grippe|"
+    r"contamin|pathog|souche|variant|vaccin|paludisme|choléra|rougeole|"
+    r"covid|sras|vih|sida|hépatite|méningite|tuberculose|peste|charbon|toxi|"
+    r"\w+(?:ellose|iase|virose)s?\b",
+    re.IGNORECASE)
+NRBCE_RE = re.compile(
+    r"radioact|nucléaire|radiolog|chimique|toxine|toxique|explos|bombe|"
+    r"uranium|plutonium|césium|iode|tritium|cobalt|radium|polonium|sarin|"
+    r"chlore|ricine|gaz|poison|empoisonn|attentat|tnt",
+    re.IGNORECASE)
+BYLINE_RE = re.compile(r"^\s*(?:par|by|source|©)\b|\(\s*[A-Z]{2,}\s*\)|@",
+                       re.IGNORECASE)
+CAPITALIZED_RE = re.compile(r"\b[A-ZÀ-Ý][\w'’-]*")
+ACRONYM_RE = re.compile(r"\b[A-Z]{2,}\b")
+
+def has_proper_noun(text: str) -> bool:
+    """Mot capitalisé hors début de phrase, ou sigle"""
+    if ACRONYM_RE.search(text):
+        return True
+    for m in CAPITALIZED_RE.finditer(text):
+        before = text[:m.start()].rstrip()
+        if before and before[-1] not in ".!?:«\"":
+            return True
+    return False
+
+# ── CHARGEMENT ───────────────────────────────────────────────────────────────
+def split_rule_book(text: str):
+    """Renvoie (préfixe, {numéro: section}, bloc final)"""
+    tail_match = TAIL_RE.search(text)
+    tail_start = tail_match.start() if tail_match else len(text)
+    starts = [m.start() for m in SECTION_RE.finditer(text, 0, tail_start)]
+    if not starts:
+        return text, {}, ""
+    prefix = text[:starts[0]]
+    sections = {}
+    for start, end in zip(starts, starts[1:] + [tail_start]):
+        number = int(SECTION_RE.match(text, start).group(1))
+        sections[number] = text[start:end]
+    return prefix, sections, text[tail_start:]
+
+def build_gazetteer(train_path: Path, label_to_section: dict) -> dict:
+    """{texte d'entité en minuscules: {sections}} à partir du train"""
+    with open(train_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    gazetteer = {}
+    for doc in data:
+        for ent in doc.get("entities", []):
+            section = label_to_section.get(ent["label"])
+            key = " ".join(WORD_RE.findall(ent["text"].lower()))
+            if section is None or not key or len(key.split()) > MAX_GAZETTEER_WORDS:
+                continue
+            gazetteer.setdefault(key, set()).add(section)
+    return gazetteer
+
+# ── LIVRE DE RÈGLES ──────────────────────────────────────────────────────────
+class RuleBook:
+    """Assemble, pour chaque segment, un prompt principal limité aux sections utiles."""
+
+    def __init__(self, text: str, gazetteer: dict | None = None):
+        self.full_text = text
+        self.prefix, self.sections, self.tail = split_rule_book(text)
+        self.label_to_section = {label: number
+                                 for number, section in self.sections.items()
+                                 for label in LABEL_RE.findall(section)}
+        self.gazetteer = gazetteer or {}
+        self._variants = {}
+
+    @classmethod
+    def load(cls, prompt_path: Path = MAIN_PROMPT_PATH, train_path: Path | None = TRAIN_JSON_PATH):
+        text = Path(prompt_path).read_text(encoding="utf-8").strip()
+        book = cls(text)
+        if train_path and Path(train_path).exists():
+            book.gazetteer = build_gazetteer(Path(train_path), book.label_to_section)
+        return book
+
+    def gazetteer_sections(self, text: str) -> set:
+        words = WORD_RE.findall(text.lower())
+        found = set()
+        for i in range(len(words)):
+            for n in range(1, min(MAX_GAZETTEER_WORDS, len(words) - i) + 1):
+                found |= self.gazetteer.get(" ".join(words[i:i + n]), set())
+        return found
+
+    def detect_sections(self, text: str) -> set:
+        """Numéros des sections pertinentes pour le segment"""
+        found = self.gazetteer_sections(text)
+        n_words = len(WORD_RE.findall(text))
+        has_capitalized = has_proper_noun(text)
+
+        if BYLINE_RE.search(text) or (n_words <= 8 and has_capitalized):
+            found.add(1)
+        if DISEASE_RE.search(text):
+            found.add(2)
+        if NRBCE_RE.search(text):
+            found.add(3)
+        if has_capitalized:
+            found.add(4)
+        if DATE_RE.search(text):
+            found.add(5)
+        # Les entités discontinues concernent surtout maladies et agents
+        if found & {2, 3}:
+            found.add(6)
+
+        if not found:
+            if FALLBACK_SECTIONS is None:
+                return set(self.sections)
+            found = set(FALLBACK_SECTIONS)
+        return found & set(self.sections)
+
+    def assemble(self, numbers) -> str:
+        """Prompt principal pour un ensemble de sections (ordre fixe, préfixe stable)"""
+        key = tuple(sorted(numbers))
+        if key == tuple(sorted(self.sections)):
+            return self.full_text
+        if key not in self._variants:
+            body = "".join(self.sections[n] for n in key)
+            self._variants[key] = self.prefix + body + self.tail
+        return self._variants[key]
+
+    def prompt_for(self, text: str) -> str:
+        return self.assemble(self.detect_sections(text))
@@ -3,20 +3,22 @@ import time
 from pathlib import Path
 from openai import OpenAI
 from tqdm import tqdm
-import tiktoken
+
+from compact_schema import (COMPACT_SYSTEM_PROMPT, build_compact_schema,
+                            load_labels)
+from prompt_manifest import (count_sweep_prompts, iter_sweep_prompts,
+                             load_changed_ids)
+from token_accounting import get_counter
 
 # === CONFIGURATION ==========================================================
 MODEL = "gpt-4.1"
 
-# Choix robuste de l’encodage ------------------------------------------------
-try:
-    ENCODING = tiktoken.encoding_for_model(MODEL)
-except KeyError:                             # gpt-4.1 pas encore mappé ?
-    ENCODING = tiktoken.get_encoding("o200k_base")
-# ----------------------------------------------------------------------------
+COUNTER = get_counter(MODEL)                 # comptage de tokens partagé (cache disque)
 
 TOKEN_LIMIT_PER_BATCH = 1_200_000           # marge de sécurité
 POLL_DELAY_SECONDS   = 240                   # délai entre deux checks
+COMPACT_SCHEMA       = False                 # sortie {"e":[{"t","l"}]} + labels en enum
+ONLY_CHANGED         = False                 # uniquement les prompts de changes.json
 
 PROMPT_ROOT_DIR = Path("ner/generated_prompts")
 OUTPUT_DIR      = Path("ner/openai_outputs_batches_2")
@@ -46,6 +48,14 @@ NER_SCHEMA = {
     "required": ["entities"],
     "additionalProperties": False
 }
+SYSTEM_PROMPT = (
+    "Tu es un assistant NER. Réponds uniquement avec un JSON du type : "
+    "{\"entities\": [{\"text\": ..., \"label\": ...}]}"
+)
+
+if COMPACT_SCHEMA:
+    NER_SCHEMA = build_compact_schema(load_labels())
+    SYSTEM_PROMPT = COMPACT_SYSTEM_PROMPT
 
 # === OUTILS =================================================================
 TERMINAL_STATUS = {"completed", "failed", "cancelled", "expired"}
@@ -62,9 +72,6 @@ def wait_until_done(batch_id: str, sleep_s: int = POLL_DELAY_SECONDS) -> str:
         print(f"⏳ Batch {batch_id} toujours {status}… nouvelle vérification dans {sleep_s}s")
         time.sleep(sleep_s)
 
-def count_tokens(text: str) -> int:
-    return len(ENCODING.encode(text))
-
 def build_batch_request(prompt_text: str, prompt_id: str) -> dict:
     return {
         "custom_id": prompt_id,
@@ -73,13 +80,7 @@ def build_batch_request(prompt_text: str, prompt_id: str) -> dict:
         "body": {
             "model": MODEL,
             "input": [
-                {
-                    "role": "system",
-                    "content": (
-                        "Tu es un assistant NER. Réponds uniquement avec un JSON du type : "
-                        "{\"entities\": [{\"text\": ..., \"label\": ...}]}"
-                    )
-                },
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt_text}
             ],
             "text": {
@@ -95,17 +96,19 @@ def build_batch_request(prompt_text: str, prompt_id: str) -> dict:
 
 # === TRAITEMENT PAR DOSSIER DE STRATÉGIE ====================================
 def process_strategy_folder_batch(strategy_dir: Path, strategy_name: str):
-    prompts = sorted(strategy_dir.glob("prompt_*.txt"))
-    print(f"\n📂 {strategy_name} : {len(prompts)} prompts trouvés")
+    only_ids  = load_changed_ids(strategy_dir) if ONLY_CHANGED else None
+    n_prompts = count_sweep_prompts(strategy_dir, only_ids)
+    print(f"\n📂 {strategy_name} : {n_prompts} prompts trouvés")
+    if not n_prompts:
+        return
 
     batches = []
     current_batch, token_count = [], 0
 
     # Découpage en batches <= TOKEN_LIMIT_PER_BATCH --------------------------
-    for prompt_file in tqdm(prompts, desc=f"🧮 Découpage batchs {strategy_name}"):
-        prompt_text = prompt_file.read_text(encoding="utf-8")
-        prompt_id   = prompt_file.stem
-        tokens      = count_tokens(prompt_text)
+    prompts = COUNTER.iter_counted(iter_sweep_prompts(strategy_dir, only_ids))
+    for prompt_id, prompt_text, tokens in tqdm(prompts, total=n_prompts,
+                                               desc=f"🧮 Découpage batchs {strategy_name}"):
         request     = build_batch_request(prompt_text, prompt_id)
 
         if token_count + tokens > TOKEN_LIMIT_PER_BATCH:
@@ -0,0 +1,118 @@
+"""
+Registre des segments résolus sans appel au LLM.
+
+Les étapes locales placées entre text_to_segments.py et
+generate_prompt_batches.py (pré-annotation par règles, …) y consignent, par
+indice de segment de test_segments.json, la prédiction qu'elles fournissent :
+    {"segments": <nb de segments>, "texts_sha1": <empreinte des textes>,
+     "resolved": {"<indice>": {"stage": "rules", "entities": [{"text", "label"}]},
+                  "<indice>": {"stage": "dedup", "copy_of": <indice de l'original>},
+                  "<indice>": {"stage": "near_dup", "doc_of": <document représentant>}}}
+generate_prompt_batches.py ne génère pas de prompt pour ces segments et
+transform_openai_predictions.py leur attribue directement cette prédiction,
+ou celle du segment original pour une copie. Les segments d'un document
+quasi identique à un autre restent vides jusqu'à reconstruct_predictions.py,
+qui reporte les entités du document représentant (near_duplicate_docs.py) ;
+une copie ne prend donc jamais pour original un tel segment : ses copies
+sont rattachées à la première d'entre elles, qui garde son prompt.
+Le registre est ignoré s'il ne correspond plus au fichier de segments
+(nombre ou texte des segments modifié).
+"""
+
+import hashlib
+import json
+from collections import defaultdict
+from pathlib import Path
+
+REGISTRY_PATH = Path("ner/resolved_segments.json")
+
+def texts_fingerprint(segments: list) -> str:
+    """sha1 des textes des segments, dans l'ordre"""
+    texts = json.dumps([seg["text"] for seg in segments], ensure_ascii=False)
+    return hashlib.sha1(texts.encode("utf-8")).hexdigest()
+
+def load_registry(segments: list, path: Path = REGISTRY_PATH) -> dict:
+    """{indice de segment: résolution} (vide si absent ou périmé)"""
+    if not path.exists():
+        return {}
+    registry = json.loads(path.read_text(encoding="utf-8"))
+    if registry.get("segments") != len(segments):
+        print(f"⚠️ {path} ignoré : {registry.get('segments')} segments enregistrés, {len(segments)} attendus. "
+              "Relancez les étapes de pré-annotation.")
+        return {}
+    if registry.get("texts_sha1") != texts_fingerprint(segments):
+        print(f"⚠️ {path} ignoré : le texte des segments a changé. Relancez les étapes de pré-annotation.")
+        return {}
+    return {int(i): entry for i, entry in registry["resolved"].items()}
+
+def save_stage(stage: str, resolved: dict, segments: list, path: Path = REGISTRY_PATH) -> int:
+    """
+    Remplace les résolutions de l'étape `stage` par `resolved` ({indice: entrée}),
+    sans toucher aux segments déjà résolus par une autre étape.
+    Renvoie le nombre de segments ajoutés.
+    """
+    registry = load_registry(segments, path)
+    kept = {i: entry for i, entry in registry.items() if entry["stage"] != stage}
+    added = 0
+    for i, entry in resolved.items():
+        if i not in kept:
+            kept[i] = {"stage": stage, **entry}
+            added += 1
+    rehomed = rehome_copies(kept)
+    if rehomed:
+        print(f"🔀 {rehomed} segment(s) copié(s) d'un document propagé : nouvel original choisi parmi les copies")
+    write_registry(kept, segments, path)
+    return added
+
+def release(indices, segments: list, stage: str, path: Path = REGISTRY_PATH) -> int:
+    """Retire du registre les segments `indices` résolus par `stage` : ils repassent par le LLM"""
+    registry = load_registry(segments, path)
+    released = [i for i in indices if registry.get(i, {}).get("stage") == stage]
+    for i in released:
+        del registry[i]
+    if released:
+        write_registry(registry, segments, path)
+    return len(released)
+
+def write_registry(entries: dict, segments: list, path: Path = REGISTRY_PATH):
+    path.write_text(json.dumps({"segments": len(segments), "texts_sha1": texts_fingerprint(segments),
+                                "resolved": {str(i): entries[i] for i in sorted(entries)}},
+                               ensure_ascii=False, indent=2), encoding="utf-8")
+
+def rehome_copies(entries: dict) -> int:
+    """
+    Copies dont l'original appartient à un document propagé ("doc_of", sans
+    réponse du LLM) : la première copie redevient un segment à prompter et
+    les autres la prennent pour original. Renvoie le nombre d'originaux déplacés.
+    """
+    stranded = defaultdict(list)
+    for i, entry in entries.items():
+        if "copy_of" in entry and "doc_of" in entries.get(entry["copy_of"], {}):
+            stranded[entry["copy_of"]].append(i)
+    for copies in stranded.values():
+        new_original, *others = sorted(copies)
+        del entries[new_original]
+        for i in others:
+            entries[i] = {**entries[i], "copy_of": new_original}
+    return len(stranded)
+
+def segment_index(custom_id: str) -> int:
+    """prompt_012 → 12 (fenêtre d'un document événements : prompt_012_c03 → 12)"""
+    return int(custom_id.split("_")[1])
+
+def registered_output(i: int, outputs: dict, registry: dict):
+    """Sortie du segment i : réponse de l'original, du LLM ou résolution locale (None si absente)"""
+    entry = registry.get(i, {})
+    if "copy_of" in entry:
+        original = entry["copy_of"]
+        # Les entités vides d'un document propagé ne valent pas pour une copie
+        if "doc_of" in registry.get(original, {}) and original not in outputs:
+            return None
+        return registered_output(original, outputs, registry)
+    if i in outputs:
+        return outputs[i]
+    if "entities" in entry:
+        return {"output": {"entities": entry["entities"]}}
+    if "doc_of" in entry:
+        return {"output": {"entities": []}}
+    return None
@@ -3,6 +3,8 @@
 Trie chaque fichier <strategy>_outputs.jsonl par ordre croissant
 de l'identifiant 'id' (ex. prompt_001, prompt_002, …).
 
+- Si un id apparaît plusieurs fois (relance incrémentale des seuls prompts
+  modifiés, ajoutée à la suite du fichier), la dernière réponse est gardée.
 - Par défaut, écrit un nouveau fichier *.sorted.jsonl.
 - Avec --in-place, réécrit le fichier original (création d'un .bak).
 """
@@ -43,7 +45,8 @@ for path in jsonl_files:
     # lecture
     entries = [json.loads(l) for l in path.read_text(encoding="utf-8").splitlines()]
 
-    # tri
+    # dédoublonnage (la réponse la plus récente l'emporte) puis tri
+    entries = list({e.get("id"): e for e in entries}.values())
     entries.sort(key=id_key)
 
     # destination
@@ -1,4 +1,24 @@
 import json
+import re
+
+from text_windows import chunk_spans
+from token_accounting import get_counter
+
+# Fusion des lignes : les lignes consécutives d'un même document sont
+# regroupées en un segment tant qu'il reste sous MERGE_TOKENS tokens
+# (titres, dates, paragraphes d'une ligne). None : une ligne = un segment.
+MERGE_TOKENS = None        # ex. 400
+MODEL = "gpt-4.1"
+
+# Lignes trop longues (articles sans saut de ligne) : un segment de plus de
+# MAX_SEGMENT_TOKENS tokens est coupé en fenêtres de phrases qui se recouvrent
+# de WINDOW_OVERLAP phrases ; une phrase encore trop longue est coupée en
+# fenêtres de mots (recouvrement OVERLAP_WORDS). Les entités trouvées deux
+# fois dans un recouvrement sont fusionnées par reconstruct_predictions.py.
+MAX_SEGMENT_TOKENS = None  # ex. 600
+WINDOW_OVERLAP = 1
+OVERLAP_WORDS = 20
+WORD_RE = re.compile(r"\S+")
 
 def split_text_with_entities(document, doc_index):
     original_text = document['text']
@@ -35,7 +55,8 @@ def split_text_with_entities(document, doc_index):
             results.append({
                 "doc_id": f"doc_{doc_index}",
                 "text": segment,
-                "entities": local_entities
+                "entities": local_entities,
+                "start": segment_start     # offset global dans le document
             })
 
         # Avancer le curseur dans le texte (ajouter 1 pour le \n consommé)
@@ -43,18 +64,103 @@ def split_text_with_entities(document, doc_index):
 
     return results
 
+def merge_segments(document, segments, budget, count_many):
+    """
+    Regroupe les segments consécutifs d'un document (sortie de
+    split_text_with_entities) tant que leur somme de tokens tient dans
+    `budget`. Le texte fusionné est la tranche exacte du document, sauts de
+    ligne compris ; les offsets des entités sont ramenés à son début.
+    """
+    tokens = count_many([seg["text"] for seg in segments])
+    groups, total = [], 0
+    for seg, n in zip(segments, tokens):
+        if groups and total + n + 1 <= budget:
+            groups[-1].append(seg)
+            total += n + 1
+        else:
+            groups.append([seg])
+            total = n
+
+    merged = []
+    for group in groups:
+        start = group[0]["start"]
+        end = group[-1]["start"] + len(group[-1]["text"])
+        entities = [{**ent,
+                     "start": [s + seg["start"] - start for s in ent["start"]],
+                     "end": [e + seg["start"] - start for e in ent["end"]]}
+                    for seg in group for ent in seg["entities"]]
+        merged.append({"doc_id": group[0]["doc_id"], "text": document["text"][start:end],
+                       "entities": entities, "start": start})
+    return merged
+
+def word_windows(text, budget, count_many):
+    """Fenêtres [début, fin) de mots d'au plus `budget` tokens, recouvrement OVERLAP_WORDS"""
+    words = [(m.start(), m.end()) for m in WORD_RE.finditer(text)]
+    tokens = count_many([text[s:e] for s, e in words])
+    windows, i = [], 0
+    while i < len(words):
+        j, total = i, 0
+        while j < len(words) and (j == i or total + tokens[j] <= budget):
+            total += tokens[j]
+            j += 1
+        windows.append((words[i][0], words[j - 1][1]))
+        if j == len(words):
+            break
+        # Recouvrement limité à la moitié de la fenêtre pour toujours avancer
+        i = max(j - min(OVERLAP_WORDS, (j - i) // 2), i + 1)
+    return windows
+
+def split_long_segment(segment, budget, count_many):
+    """
+    Segment de plus de `budget` tokens → fenêtres de phrases (ou de mots)
+    qui se recouvrent. Chaque fenêtre garde les entités qu'elle contient
+    entièrement, avec offsets ramenés à son début.
+    """
+    text = segment["text"]
+    if count_many([text])[0] <= budget:
+        return [segment]
+    windows = []
+    for start, end in chunk_spans(text, budget, WINDOW_OVERLAP, count_many):
+        if count_many([text[start:end]])[0] <= budget:
+            windows.append((start, end))
+        else:
+            windows.extend((start + s, start + e) for s, e in word_windows(text[start:end], budget, count_many))
+
+    pieces = []
+    for start, end in windows:
+        entities = [{**ent, "start": [s - start for s in ent["start"]], "end": [e - start for e in ent["end"]]}
+                    for ent in segment["entities"]
+                    if start <= min(ent["start"]) and max(ent["end"]) <= end]
+        pieces.append({"doc_id": segment["doc_id"], "text": text[start:end],
+                       "entities": entities, "start": segment["start"] + start})
+    return pieces
+
 # === Exemple d'utilisation ===
 input_path = "datasets/test.json"
 output_path = "test_segments.json"
 
-with open(input_path, "r") as f:
-    data = json.load(f)
+if __name__ == "__main__":
+    with open(input_path, "r") as f:
+        data = json.load(f)
 
-split_data = []
-for i, doc in enumerate(data):
-    split_data.extend(split_text_with_entities(doc, i))
+    count_many = get_counter(MODEL).count_many if MERGE_TOKENS or MAX_SEGMENT_TOKENS else None
+    split_data, n_split = [], 0
+    for i, doc in enumerate(data):
+        segments = split_text_with_entities(doc, i)
+        if MERGE_TOKENS:
+            segments = merge_segments(doc, segments, MERGE_TOKENS, count_many)
+        if MAX_SEGMENT_TOKENS:
+            windows = [split_long_segment(seg, MAX_SEGMENT_TOKENS, count_many) for seg in segments]
+            n_split += sum(len(w) > 1 for w in windows)
+            segments = [piece for w in windows for piece in w]
+        split_data.extend(segments)
 
-with open(output_path, "w") as f:
-    json.dump(split_data, f, ensure_ascii=False, indent=2)
+    with open(output_path, "w") as f:
+        json.dump(split_data, f, ensure_ascii=False, indent=2)
 
-print(f"✅ Fichier '{output_path}' généré avec {len(split_data)} segments.")
+    print(f"✅ Fichier '{output_path}' généré avec {len(split_data)} segments.")
+    if MERGE_TOKENS:
+        print(f"🧩 Lignes fusionnées jusqu'à {MERGE_TOKENS} tokens : "
+              f"{len(split_data) / max(len(data), 1):.1f} segments par document")
+    if MAX_SEGMENT_TOKENS:
+        print(f"🪟 {n_split} segment(s) de plus de {MAX_SEGMENT_TOKENS} tokens découpé(s) en fenêtres")
@@ -0,0 +1,118 @@
+"""
+Réduction d'un texte aux phrases qui portent ses événements.
+
+Seules les phrases contenant une position d'intérêt (occurrence d'attribut
+d'événement pour les démos, entité prédite par le NER pour les cibles) sont
+gardées, avec CONTEXT_SENTENCES phrases de contexte de part et d'autre ;
+les passages supprimés sont remplacés par un marqueur d'élision. Découpage
+en fenêtres de phrases pour les documents longs.
+Module partagé : pipelines événements (event/, event-cot/) et découpage des
+lignes trop longues de text_to_segments.py.
+"""
+
+import re
+
+CONTEXT_SENTENCES = 1
+ELISION = "[…]"
+
+# Fin de phrase : ponctuation forte suivie d'un blanc et d'une majuscule /
+# d'un chiffre / d'une ouverture de citation, ou saut de ligne.
+BOUNDARY_RE = re.compile(r"(?<=[.!?…])\s+(?=[A-ZÀ-Ý«\"\d])|\s*\n+\s*")
+# Abréviations qui ne terminent pas une phrase (« M. Dupont », « J. Martin »)
+ABBREVIATION_RE = re.compile(r"(?:\b[A-ZÀ-Ý]|\bM|\bMme|\bMM|\bDr|\bPr|\bSt|\betc|\bcf|\bp)\.$")
+
+def sentence_spans(text: str) -> list:
+    """Intervalles [début, fin) des phrases du texte"""
+    spans, start = [], 0
+    for m in BOUNDARY_RE.finditer(text):
+        if ABBREVIATION_RE.search(text, start, m.start()) and "\n" not in m.group():
+            continue
+        if m.start() > start:
+            spans.append((start, m.start()))
+        start = m.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+def occurrence_positions(text: str, occurrences) -> list:
+    """Positions de toutes les occurrences (sensible à la casse, sinon insensible)"""
+    lowered = text.lower()
+    positions = []
+    for occ in set(o.strip() for o in occurrences if o and o.strip()):
+        found = [m.start() for m in re.finditer(re.escape(occ), text)]
+        if not found:
+            found = [m.start() for m in re.finditer(re.escape(occ.lower()), lowered)]
+        positions.extend(found)
+    return positions
+
+def compress(text: str, positions, context: int = CONTEXT_SENTENCES):
+    """
+    Texte réduit aux phrases contenant une des `positions` (± `context`
+    phrases) et correspondance des offsets : liste de segments
+    [début compressé, début original, longueur]. Sans réduction possible,
+    renvoie le texte complet (un seul segment).
+    """
+    spans = sentence_spans(text)
+    identity = (text, [[0, 0, len(text)]])
+    if not spans or not positions:
+        return identity
+
+    keep = set()
+    for pos in positions:
+        i = next((i for i, (s, e) in enumerate(spans) if s <= pos < e), None)
+        if i is not None:
+            keep.update(range(max(i - context, 0), min(i + context + 1, len(spans))))
+    if not keep or len(keep) == len(spans):
+        return identity
+
+    pieces, mapping, previous, offset = [], [], -1, 0
+    for i in sorted(keep):
+        if i != previous + 1:
+            pieces.append(ELISION)
+            offset += len(ELISION) + 1
+        s, e = spans[i]
+        mapping.append([offset, s, e - s])
+        pieces.append(text[s:e])
+        offset += e - s + 1
+        previous = i
+    if previous != len(spans) - 1:
+        pieces.append(ELISION)
+    return " ".join(pieces), mapping
+
+def to_original(offset: int, mapping):
+    """Offset du texte compressé → offset du texte original (None dans une élision)"""
+    for c_start, o_start, length in mapping:
+        if c_start <= offset <= c_start + length:
+            return o_start + offset - c_start
+    return None
+
+def trim_to_events(text: str, occurrences, context: int = CONTEXT_SENTENCES) -> str:
+    """
+    Texte réduit aux phrases portant une occurrence (± `context` phrases).
+    Renvoie le texte complet si aucune occurrence n'y est retrouvée.
+    """
+    return compress(text, occurrence_positions(text, occurrences), context)[0]
+
+def chunk_spans(text: str, budget: int, overlap: int, count_many) -> list:
+    """
+    Fenêtres [début, fin) de phrases consécutives d'au plus `budget` tokens
+    (une phrase plus longue forme seule sa fenêtre), qui se recouvrent de
+    `overlap` phrases. `count_many` compte les tokens d'une liste de textes.
+    """
+    spans = sentence_spans(text)
+    if not spans:
+        return [(0, len(text))]
+    tokens = count_many([text[s:e] for s, e in spans])
+    windows, i = [], 0
+    while True:
+        j, total = i, 0
+        while j < len(spans) and (j == i or total + tokens[j] <= budget):
+            total += tokens[j]
+            j += 1
+        windows.append((spans[i][0], spans[j - 1][1]))
+        if j == len(spans):
+            return windows
+        i = max(j - overlap, i + 1)
+        # Pas de recouvrement si la fenêtre suivante ne pourrait rien ajouter
+        if sum(tokens[i:j + 1]) > budget:
+            i = j
@@ -0,0 +1,248 @@
+"""
+Comptage de tokens partagé par les pipelines NER et événements.
+
+- cache disque des comptes, indexé par le hash du contenu ;
+- encodage par lots en parallèle (tiktoken encode_batch) des textes absents du cache ;
+- préfixe commun compté une seule fois : un prompt est compté comme
+  <tout ce qui précède le dernier séparateur> + <séparateur + cible>, et le
+  préfixe (règles + démos), identique d'un prompt à l'autre, vient du cache ;
+- estimation rapide calibrée (caractères / token) avec marge de sécurité,
+  pour la planification : le ratio est mesuré sur les CALIBRATION_SAMPLE
+  premiers prompts quand le cache n'en contient pas encore, puis sauvegardé ;
+- encodage chargé paresseusement (seulement si un texte manque au cache)
+  depuis un cache local de fichiers BPE (TIKTOKEN_CACHE_DIR, par défaut
+  ner/cache/tiktoken), dont le sha256 est vérifié (valeurs attendues par
+  tiktoken) au pré-remplissage comme au chargement. Avec TOKENIZER_OFFLINE=1,
+  aucun accès réseau : un fichier absent ou corrompu provoque une erreur
+  explicite au lieu d'un téléchargement.
+
+Usage :
+    from token_accounting import get_counter
+    counter = get_counter()
+    n = counter.count_prompt(prompt_text)
+
+Pré-remplir le cache (machine connectée, ou copie d'un fichier .tiktoken) :
+    python ner/token_accounting.py --seed [--from o200k_base.tiktoken]
+"""
+
+import argparse
+import atexit
+import hashlib
+import json
+import math
+import os
+import shutil
+from itertools import islice
+from pathlib import Path
+
+# ── CONFIG ───────────────────────────────────────────────────────────────────
+MODEL = "gpt-4.1"
+CACHE_DIR = Path("ner/cache")
+N_THREADS = 8
+CHUNK_SIZE = 256                   # prompts encodés par lot
+SEPARATOR = "-" * 80
+DEFAULT_CHARS_PER_TOKEN = 3.0      # prudent tant que rien n'est calibré
+CALIBRATION_SAMPLE = 64            # prompts comptés exactement pour calibrer
+ESTIMATE_MARGIN = 0.10             # +10 % sur les estimations rapides
+
+DEFAULT_ENCODING = "o200k_base"
+BPE_URL = "https://openaipublic.blob.core.windows.net/encodings/{name}.tiktoken"
+TIKTOKEN_CACHE_DIR = Path(os.environ.get("TIKTOKEN_CACHE_DIR", CACHE_DIR / "tiktoken"))
+OFFLINE = os.environ.get("TOKENIZER_OFFLINE", "0") == "1"
+# sha256 des fichiers BPE, repris de tiktoken_ext/openai_public.py
+EXPECTED_SHA256 = {
+    "r50k_base": "306cd27f03c1a714eca7108e03d66b7dc042abe8c258b44c199a7ed9838dd930",
+    "p50k_base": "94b5ca7dff4d00767bc256fdd1b27e5b17361d7b8a5f968547f9f23eb70d2069",
+    "cl100k_base": "223921b76ee99bde995b7ff738513eef100fb51d18c93597a113bcffe865b2a7",
+    "o200k_base": "446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d",
+}
+
+# tiktoken lit TIKTOKEN_CACHE_DIR au premier chargement d'un encodage
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", str(TIKTOKEN_CACHE_DIR))
+
+# ── ENCODAGE ─────────────────────────────────────────────────────────────────
+def encoding_name(model: str = MODEL) -> str:
+    """Nom de l'encodage du modèle, sans rien charger"""
+    from tiktoken.model import encoding_name_for_model
+    try:
+        return encoding_name_for_model(model)
+    except KeyError:                   # modèle pas encore mappé
+        return DEFAULT_ENCODING
+
+def bpe_cache_path(name: str) -> Path:
+    """Fichier attendu par tiktoken : sha1 de l'URL du fichier BPE"""
+    url = BPE_URL.format(name=name)
+    return TIKTOKEN_CACHE_DIR / hashlib.sha1(url.encode()).hexdigest()
+
+def check_bpe(path: Path, name: str) -> bool:
+    """Le fichier BPE a-t-il le sha256 attendu par tiktoken ?"""
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+    return digest == EXPECTED_SHA256[name]
+
+def load_encoding(model: str = MODEL):
+    name = encoding_name(model)
+    path = bpe_cache_path(name)
+    seed_hint = f"Pré-remplir avec : python ner/token_accounting.py --seed --from <{name}.tiktoken>"
+    if OFFLINE:
+        if name not in EXPECTED_SHA256:
+            raise RuntimeError(f"❌ Mode hors ligne : encodage '{name}' non pris en charge "
+                               f"(attendus : {', '.join(EXPECTED_SHA256)}).")
+        if not path.exists():
+            raise RuntimeError(f"❌ Mode hors ligne : encodage '{name}' absent de {TIKTOKEN_CACHE_DIR}. {seed_hint}")
+        if not check_bpe(path, name):
+            raise RuntimeError(f"❌ Mode hors ligne : {path} ne correspond pas au sha256 attendu pour "
+                               f"'{name}' (fichier corrompu ou d'un autre encodage). {seed_hint}")
+    elif path.exists() and name in EXPECTED_SHA256 and not check_bpe(path, name):
+        print(f"⚠️ {path} : sha256 inattendu pour '{name}', tiktoken va le retélécharger")
+    import tiktoken
+    return tiktoken.get_encoding(name)
+
+def seed_cache(model: str = MODEL, source: Path | None = None) -> Path:
+    """Copie un fichier BPE local dans le cache (ou le télécharge une fois), après vérification"""
+    name = encoding_name(model)
+    target = bpe_cache_path(name)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if source:
+        if name in EXPECTED_SHA256 and not check_bpe(source, name):
+            raise SystemExit(f"❌ {source} ne correspond pas au sha256 attendu pour '{name}'")
+        shutil.copyfile(source, target)
+    else:
+        load_encoding(model)
+    if name in EXPECTED_SHA256 and not (target.exists() and check_bpe(target, name)):
+        raise SystemExit(f"❌ {target} absent ou sha256 inattendu pour '{name}'")
+    return target
+
+def content_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+# ── COMPTEUR ─────────────────────────────────────────────────────────────────
+class TokenCounter:
+    """Comptes exacts mis en cache + estimation calibrée"""
+
+    def __init__(self, model: str = MODEL, cache_dir: Path = CACHE_DIR):
+        self.model = model
+        self._encoding = None
+        self.cache_path = Path(cache_dir) / f"token_counts_{encoding_name(model)}.json"
+        self.counts = {}
+        self.calibration = None        # {"chars_per_token", "sample"} une fois mesuré
+        self._dirty = False
+        if self.cache_path.exists():
+            cache = json.loads(self.cache_path.read_text(encoding="utf-8"))
+            self.counts = cache.get("counts", {})
+            self.calibration = cache.get("calibration")
+
+    @property
+    def encoding(self):
+        """Chargé au premier texte absent du cache seulement"""
+        if self._encoding is None:
+            self._encoding = load_encoding(self.model)
+        return self._encoding
+
+    # ---- comptes exacts ----
+    def count_many(self, texts) -> list:
+        """Comptes exacts ; seuls les textes inconnus du cache sont encodés, en parallèle"""
+        keys = [content_key(t) for t in texts]
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self.counts:
+                missing[key] = text
+        if missing:
+            encoded = self.encoding.encode_batch(list(missing.values()), num_threads=N_THREADS)
+            self.counts.update((key, len(tokens)) for key, tokens in zip(missing, encoded))
+            self._dirty = True
+        return [self.counts[key] for key in keys]
+
+    def count(self, text: str) -> int:
+        return self.count_many([text])[0]
+
+    def count_prompts(self, prompts) -> list:
+        """
+        Comptes de prompts « préfixe partagé + cible » : le préfixe (avant le
+        dernier séparateur) n'est encodé qu'une fois pour tous les prompts
+        qui le partagent. Écart possible de quelques tokens à la jonction.
+        """
+        heads, tails = [], []
+        for prompt in prompts:
+            head, sep, tail = prompt.rpartition(SEPARATOR)
+            heads.append(head)
+            tails.append(sep + tail)
+        counts = self.count_many(heads + tails)
+        return [h + t for h, t in zip(counts[:len(heads)], counts[len(heads):])]
+
+    def count_prompt(self, prompt: str) -> int:
+        return self.count_prompts([prompt])[0]
+
+    def iter_counted(self, items, estimate: bool = False, chunk_size: int = CHUNK_SIZE):
+        """
+        Flux de (prompt_id, texte) → (prompt_id, texte, n_tokens), compté par
+        lots de `chunk_size` (ou estimé si `estimate`).
+        """
+        items = iter(items)
+        while chunk := list(islice(items, chunk_size)):
+            texts = [text for _, text in chunk]
+            if estimate and self.calibration is None:
+                self.calibrate(texts[:CALIBRATION_SAMPLE])
+            counts = ([self.estimate(t) for t in texts] if estimate
+                      else self.count_prompts(texts))
+            for (prompt_id, text), n in zip(chunk, counts):
+                yield prompt_id, text, n
+
+    # ---- estimation rapide ----
+    @property
+    def chars_per_token(self) -> float:
+        return self.calibration["chars_per_token"] if self.calibration else DEFAULT_CHARS_PER_TOKEN
+
+    def calibrate(self, sample_prompts):
+        """Mesure le ratio caractères / token sur un échantillon de prompts réels"""
+        try:
+            n_tokens = sum(self.count_prompts(sample_prompts))
+        except RuntimeError as e:          # hors ligne sans encodage : ratio par défaut
+            print(f"⚠️ Calibration impossible, {DEFAULT_CHARS_PER_TOKEN} caractères / token retenus\n{e}")
+            return self.chars_per_token
+        n_chars = sum(len(t) for t in sample_prompts)
+        if n_tokens:
+            self.calibration = {"chars_per_token": n_chars / n_tokens, "sample": len(sample_prompts)}
+            self._dirty = True
+            print(f"📏 Calibration sur {len(sample_prompts)} prompts : "
+                  f"{self.chars_per_token:.2f} caractères / token → {self.cache_path}")
+        return self.chars_per_token
+
+    def estimate(self, text: str, margin: float = ESTIMATE_MARGIN) -> int:
+        """Majorant rapide (sans encodage) pour la planification"""
+        return math.ceil(len(text) / self.chars_per_token * (1 + margin))
+
+    # ---- persistance ----
+    def save(self):
+        if not self._dirty:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({
+            "calibration": self.calibration,
+            "counts": self.counts
+        }), encoding="utf-8")
+        tmp_path.replace(self.cache_path)
+        self._dirty = False
+
+_COUNTERS = {}
+
+def get_counter(model: str = MODEL) -> TokenCounter:
+    """Compteur partagé du processus, sauvegardé automatiquement à la sortie"""
+    if model not in _COUNTERS:
+        _COUNTERS[model] = TokenCounter(model)
+        atexit.register(_COUNTERS[model].save)
+    return _COUNTERS[model]
+
+def count_tokens(text: str) -> int:
+    return get_counter().count(text)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pré-remplit le cache local de l'encodage")
+    parser.add_argument("--seed", action="store_true", help="installe le fichier BPE dans le cache")
+    parser.add_argument("--from", dest="source", type=Path, help="fichier .tiktoken déjà téléchargé")
+    parser.add_argument("--model", default=MODEL)
+    args = parser.parse_args()
+    if not args.seed:
+        parser.error("rien à faire (utiliser --seed)")
+    path = seed_cache(args.model, args.source)
+    print(f"✅ Encodage '{encoding_name(args.model)}' disponible hors ligne → {path}")
@@ -3,6 +3,8 @@ import json, re, uuid
 from pathlib import Path
 from tqdm import tqdm
 
+from segment_registry import load_registry, registered_output, segment_index
+
 # === CONFIGURATION ==========================================================
 SEGMENT_PATH        = Path("test_segments.json")
 OPENAI_OUTPUTS_DIR  = Path("ner/batch_results_ordered")
@@ -37,15 +39,27 @@ def next_after(text, segment, start_from):
         return None
     return m.start() + start_from, m.end() + start_from
 
+resolved = load_registry(test_segments)
+if resolved:
+    print(f"🧾 {len(resolved)} segments résolus localement (registre)")
+
 for file_path in jsonl_files:
     strategy = file_path.stem.replace("_outputs", "")
     out_path = ALIGNMENTS_DIR / f"{strategy}_with_offsets.json"
 
     preds = [json.loads(l) for l in file_path.read_text(encoding="utf-8").splitlines()]
+    # correspondance id → segment (prompt_012 → test_segments[12]) ; les
+    # segments résolus localement reprennent la prédiction du registre, les
+    # copies exactes celle de leur original
+    preds = {segment_index(p["id"]): p for p in preds}
+    outputs = [registered_output(i, preds, resolved) for i in range(len(test_segments))]
+    missing = [i for i, pred in enumerate(outputs) if pred is None]
+    if missing:
+        print(f"⚠️ {strategy} : {len(missing)} segment(s) sans sortie → aucune entité")
     aligned = []
 
-    for i, pred in enumerate(tqdm(preds, desc=f"🔁 Align {strategy}")):
-        seg_gold   = test_segments[i]           # correspondance index → segment
+    for seg_gold, pred in zip(tqdm(test_segments, desc=f"🔁 Align {strategy}"), outputs):
+        pred       = pred or {}
         txt_seg    = seg_gold["text"]
 
         cur_pos = 0                             # où commence la recherche
@@ -72,7 +86,8 @@ for file_path in jsonl_files:
         aligned.append({
             "doc_id":  seg_gold["doc_id"],
             "text":    txt_seg,
-            "entities": entities
+            "entities": entities,
+            **({"start": seg_gold["start"]} if "start" in seg_gold else {})
         })
 
     out_path.write_text(json.dumps(aligned, ensure_ascii=False, indent=2),
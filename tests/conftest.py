@@ -0,0 +1,6 @@
+"""Les modules de ner/ s'importent entre eux par leur nom (scripts lancés depuis la racine)"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "ner"))
@@ -0,0 +1,36 @@
+import numpy as np
+
+import minhash_lsh
+from minhash_lsh import cluster_near_duplicates, minhash_signatures, shingles
+
+DISPATCH = ("Le ministère de la Santé annonce un cas de choléra à Marseille ce mardi, "
+            "selon un communiqué transmis à l'AFP en fin de matinée.")
+
+
+def test_shingles_ignore_case_and_spacing():
+    assert shingles("Choléra  à\nMayotte") == shingles("choléra à mayotte")
+    assert shingles("abc") == {"abc"}
+
+
+def test_signatures_are_deterministic():
+    assert (minhash_signatures([DISPATCH]) == minhash_signatures([DISPATCH])).all()
+
+
+def test_cluster_near_duplicates_keeps_smallest_index_as_representative():
+    texts = ["Prévisions météo : pluie sur la Bretagne et vent fort sur les côtes.",
+             DISPATCH,
+             DISPATCH.replace("mardi", "mercredi"),
+             "Sans aucun rapport.",
+             DISPATCH + " (mise à jour)"]
+    assert cluster_near_duplicates(texts) == [0, 1, 1, 3, 1]
+
+
+def test_candidate_is_compared_with_every_bucket_member(monkeypatch):
+    # Les trois textes ne partagent que le seau de la 1re bande, ouvert par a ;
+    # c est proche de b (3/4) mais pas de a (2/4) : il doit rejoindre b.
+    signatures = np.array([[1, 1, 5, 6],
+                           [1, 1, 7, 8],
+                           [1, 1, 7, 9]], dtype=np.uint64)
+    monkeypatch.setattr(minhash_lsh, "minhash_signatures", lambda texts, num_perm: signatures)
+    assert minhash_lsh.cluster_near_duplicates(["a", "b", "c"], threshold=0.75,
+                                               num_perm=4, bands=2) == [0, 1, 1]
@@ -0,0 +1,46 @@
+from near_duplicate_docs import OffsetMap, carry_entities, needs_inference
+
+REP = "Un cas de choléra a été confirmé hier à Mayotte par les autorités."
+MEMBER = "Selon l'agence, un cas de choléra a été confirmé hier à Mayotte par les autorités sanitaires."
+
+
+def entity(text, surface, label, ent_id):
+    start = text.index(surface)
+    return {"text": surface, "start": [start], "end": [start + len(surface)], "label": label, "id": ent_id}
+
+
+def test_offset_map_follows_insertions():
+    offsets = OffsetMap(REP, MEMBER)
+    pos = REP.index("Mayotte")
+    assert offsets.map(pos) == MEMBER.index("Mayotte")
+    assert offsets.map(0) is None          # « U » devenu « u »
+
+
+def test_changed_regions_cover_both_sides():
+    regions = OffsetMap("le chat dort", "le chien dort").changed_regions()
+    assert {text for text, _, _ in regions} == {"le chat dort", "le chien dort"}
+
+
+def test_carry_entities_transposes_offsets_and_keeps_ids():
+    rep_doc = {"text": REP, "entities": [entity(REP, "choléra", "INF_DISEASE", "T1"),
+                                         entity(REP, "Mayotte", "LOCATION", "T2")]}
+    carried, dropped = carry_entities(rep_doc, MEMBER)
+    assert dropped == 0
+    assert [e["id"] for e in carried] == ["T1", "T2"]
+    for ent in carried:
+        assert MEMBER[ent["start"][0]:ent["end"][0]] == ent["text"]
+
+
+def test_carry_entities_drops_modified_mentions():
+    member = REP.replace("Mayotte", "La Réunion")
+    rep_doc = {"text": REP, "entities": [entity(REP, "choléra", "INF_DISEASE", "T1"),
+                                         entity(REP, "Mayotte", "LOCATION", "T2")]}
+    carried, dropped = carry_entities(rep_doc, member)
+    assert dropped == 1
+    assert [e["id"] for e in carried] == ["T1"]
+
+
+def test_needs_inference_only_on_entity_cues():
+    assert not needs_inference(REP, REP.replace("par les autorités", "selon les services"))
+    assert needs_inference(REP, REP.replace("Mayotte", "Marseille"))
+    assert needs_inference(REP, REP.replace("hier", "le 3 mars"))
@@ -0,0 +1,39 @@
+import json
+
+from prompt_manifest import RESULTS_DIR, load_changed_ids, remap_by_hash, update_manifest
+
+
+def entries(hashes):
+    return [{"id": f"prompt_{i:03}", "segment": i, "hash": h} for i, h in enumerate(hashes)]
+
+
+def read_outputs(path):
+    return {e["id"]: e["output"] for e in map(json.loads, path.read_text(encoding="utf-8").splitlines())}
+
+
+def test_remap_by_hash_follows_shifted_content():
+    previous = {"prompt_000": "a", "prompt_001": "b"}
+    current = {"prompt_000": "a", "prompt_001": "x", "prompt_002": "b"}
+    assert remap_by_hash(previous, current) == {"prompt_000": ["prompt_000"], "prompt_001": ["prompt_002"]}
+
+
+def test_inserted_segment_only_changes_new_content(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sweep = tmp_path / "density_k4"
+    outputs = RESULTS_DIR / "density_k4_outputs.jsonl"
+    outputs.parent.mkdir(parents=True)
+
+    update_manifest(sweep, entries("abc"))
+    outputs.write_text("".join(json.dumps({"id": f"prompt_{i:03}", "output": t}) + "\n"
+                               for i, t in enumerate("abc")), encoding="utf-8")
+
+    changes = update_manifest(sweep, entries("axbc"))
+    assert changes == {"changed": ["prompt_001"], "removed": [], "moved": 2}
+    assert read_outputs(outputs) == {"prompt_000": "a", "prompt_002": "b", "prompt_003": "c"}
+    assert load_changed_ids(sweep) == {"prompt_001"}
+
+    # Suppression du 1er segment : la réponse périmée part, « x » reste en attente
+    changes = update_manifest(sweep, entries("xbc"))
+    assert changes["changed"] == []
+    assert read_outputs(outputs) == {"prompt_001": "b", "prompt_002": "c"}
+    assert load_changed_ids(sweep) == {"prompt_000"}
@@ -0,0 +1,44 @@
+import reconstruct_predictions
+from reconstruct_predictions import recompose_predictions_with_alignment, stitch_overlaps
+
+TEXT = "Le virus de la dengue circule en Guyane. Le virus de la dengue inquiète."
+
+
+def entity(start, end, label="INF_DISEASE", ent_id="T1"):
+    return {"text": TEXT[start:end], "start": [start], "end": [end], "label": label, "id": ent_id}
+
+
+def test_entity_seen_in_two_windows_is_kept_once():
+    dengue = entity(3, 21)
+    assert stitch_overlaps([dengue, dict(dengue, id="T9")], [0, 1]) == [dengue]
+
+
+def test_entity_cut_at_a_window_edge_gives_way_to_the_longer_one():
+    full, cut = entity(3, 21), entity(15, 21, ent_id="T2")
+    assert stitch_overlaps([cut, full], [1, 0]) == [full]
+
+
+def test_nested_entities_of_one_window_are_kept():
+    full, inner = entity(3, 21), entity(15, 21, ent_id="T2")
+    assert stitch_overlaps([full, inner], [0, 0]) == [full, inner]
+
+
+def test_other_labels_are_kept():
+    disease, location = entity(3, 21), entity(3, 21, "LOCATION", "T2")
+    assert stitch_overlaps([disease, location], [0, 1]) == [disease, location]
+
+
+def test_recompose_stitches_overlapping_windows(monkeypatch):
+    monkeypatch.setattr(reconstruct_predictions, "original_docs",
+                        {"doc_0": {"text": TEXT}}, raising=False)
+    cut = 41                                  # début de la 2e phrase
+    windows = [
+        {"doc_id": "doc_0", "text": TEXT[:56], "start": 0,
+         "entities": [{"text": "dengue", "start": [15], "end": [21], "label": "INF_DISEASE", "id": "T1"},
+                      {"text": "virus de la", "start": [44], "end": [55], "label": "INF_DISEASE", "id": "T2"}]},
+        {"doc_id": "doc_0", "text": TEXT[cut:], "start": cut,
+         "entities": [{"text": "virus de la dengue", "start": [3], "end": [21], "label": "INF_DISEASE", "id": "T3"}]},
+    ]
+    [doc] = recompose_predictions_with_alignment(windows)
+    assert [(e["text"], e["start"], e["end"]) for e in doc["entities"]] == [
+        ("dengue", [15], [21]), ("virus de la dengue", [44], [62])]
@@ -0,0 +1,50 @@
+from segment_registry import (load_registry, registered_output, release, save_stage,
+                              segment_index)
+
+SEGMENTS = [{"text": t} for t in ("Paris", "Fièvre Q à Lyon.", "Paris", "Fièvre Q à Lyon.", "Paris")]
+
+
+def test_copies_fan_out_to_the_original_answer():
+    registry = {2: {"stage": "dedup", "copy_of": 0}, 4: {"stage": "dedup", "copy_of": 2}}
+    outputs = {0: {"output": {"entities": [{"text": "Paris", "label": "LOCATION"}]}}}
+    assert registered_output(2, outputs, registry) == outputs[0]
+    assert registered_output(4, outputs, registry) == outputs[0]
+    assert registered_output(1, outputs, registry) is None
+
+
+def test_copy_of_a_propagated_document_waits_for_its_answer():
+    registry = {0: {"stage": "near_dup", "doc_of": 7}, 2: {"stage": "dedup", "copy_of": 0}}
+    assert registered_output(0, {}, registry) == {"output": {"entities": []}}
+    assert registered_output(2, {}, registry) is None
+
+
+def test_save_stage_rehomes_copies_of_propagated_segments(tmp_path):
+    path = tmp_path / "resolved.json"
+    save_stage("dedup", {2: {"copy_of": 0}, 4: {"copy_of": 0}}, SEGMENTS, path)
+    save_stage("near_dup", {0: {"doc_of": 5}}, SEGMENTS, path)
+    registry = load_registry(SEGMENTS, path)
+    assert 2 not in registry                 # la première copie garde son prompt
+    assert registry[4]["copy_of"] == 2
+    assert registry[0]["stage"] == "near_dup"
+
+
+def test_registry_is_ignored_when_segments_change(tmp_path, capsys):
+    path = tmp_path / "resolved.json"
+    save_stage("rules", {1: {"entities": []}}, SEGMENTS, path)
+    assert load_registry(SEGMENTS, path)
+    edited = SEGMENTS[:1] + [{"text": "Fièvre Q à Lille."}] + SEGMENTS[2:]
+    assert load_registry(edited, path) == {}
+    assert "texte des segments a changé" in capsys.readouterr().out
+
+
+def test_release_only_touches_its_stage(tmp_path):
+    path = tmp_path / "resolved.json"
+    save_stage("rules", {1: {"entities": []}}, SEGMENTS, path)
+    save_stage("near_dup", {3: {"doc_of": 0}}, SEGMENTS, path)
+    assert release([1, 3], SEGMENTS, "near_dup", path) == 1
+    assert set(load_registry(SEGMENTS, path)) == {1}
+
+
+def test_segment_index_accepts_window_ids():
+    assert segment_index("prompt_012") == 12
+    assert segment_index("prompt_012_c03") == 12
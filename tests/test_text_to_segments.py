@@ -0,0 +1,83 @@
+from text_to_segments import merge_segments, split_long_segment, split_text_with_entities
+
+DOC = {
+    "text": "Alerte sanitaire\n\nUn cas de dengue à Cayenne.\nLe patient va bien.",
+    "entities": [],
+}
+for surface, label, ent_id in (("dengue", "INF_DISEASE", "T1"), ("Cayenne", "LOCATION", "T2")):
+    start = DOC["text"].index(surface)
+    DOC["entities"].append({"text": surface, "start": [start], "end": [start + len(surface)],
+                            "label": label, "id": ent_id})
+
+
+def count_words(texts):
+    return [len(t.split()) for t in texts]
+
+
+def assert_offsets(document, segments):
+    for seg in segments:
+        assert document["text"][seg["start"]:seg["start"] + len(seg["text"])] == seg["text"]
+        for ent in seg["entities"]:
+            assert seg["text"][ent["start"][0]:ent["end"][0]] == ent["text"]
+
+
+def test_split_skips_empty_lines_and_keeps_offsets():
+    segments = split_text_with_entities(DOC, 0)
+    assert [seg["text"] for seg in segments] == ["Alerte sanitaire", "Un cas de dengue à Cayenne.",
+                                                 "Le patient va bien."]
+    assert_offsets(DOC, segments)
+
+
+def test_merge_segments_groups_lines_within_budget():
+    segments = split_text_with_entities(DOC, 0)
+    merged = merge_segments(DOC, segments, budget=10, count_many=count_words)
+    assert [seg["text"] for seg in merged] == ["Alerte sanitaire\n\nUn cas de dengue à Cayenne.",
+                                               "Le patient va bien."]
+    assert [ent["id"] for ent in merged[0]["entities"]] == ["T1", "T2"]
+    assert_offsets(DOC, merged)
+
+
+def test_merge_segments_large_budget_gives_whole_document():
+    merged = merge_segments(DOC, split_text_with_entities(DOC, 0), budget=100, count_many=count_words)
+    assert len(merged) == 1
+    assert merged[0]["text"] == DOC["text"]
+    assert merged[0]["start"] == 0
+
+
+LONG = {"doc_id": "doc_1", "start": 100,
+        "text": "Un foyer de rougeole est signalé à Lille. Trois enfants sont hospitalisés. "
+                "Les autorités appellent à la vaccination. La rougeole reste très contagieuse.",
+        "entities": []}
+for surface, label, ent_id in (("rougeole", "INF_DISEASE", "T1"), ("Lille", "LOCATION", "T2")):
+    start = LONG["text"].index(surface)
+    LONG["entities"].append({"text": surface, "start": [start], "end": [start + len(surface)],
+                             "label": label, "id": ent_id})
+
+
+def test_short_segment_is_not_split():
+    assert split_long_segment(LONG, budget=100, count_many=count_words) == [LONG]
+
+
+def test_split_long_segment_into_overlapping_sentence_windows():
+    pieces = split_long_segment(LONG, budget=12, count_many=count_words)
+    assert len(pieces) > 1
+    assert all(count_words([p["text"]])[0] <= 12 for p in pieces)
+    # Recouvrement d'une phrase entre fenêtres consécutives
+    for a, b in zip(pieces, pieces[1:]):
+        assert b["start"] < a["start"] + len(a["text"])
+    assert pieces[0]["text"].startswith("Un foyer de rougeole")
+    assert pieces[-1]["text"].endswith("très contagieuse.")
+    for piece in pieces:
+        local = piece["start"] - LONG["start"]
+        assert LONG["text"][local:local + len(piece["text"])] == piece["text"]
+        for ent in piece["entities"]:
+            assert piece["text"][ent["start"][0]:ent["end"][0]] == ent["text"]
+    assert {e["id"] for p in pieces for e in p["entities"]} == {"T1", "T2"}
+
+
+def test_overlong_sentence_falls_back_to_word_windows():
+    sentence = {"doc_id": "doc_2", "start": 0, "entities": [],
+                "text": " ".join(f"mot{i}" for i in range(30))}
+    pieces = split_long_segment(sentence, budget=8, count_many=count_words)
+    assert all(count_words([p["text"]])[0] <= 8 for p in pieces)
+    assert pieces[-1]["text"].endswith("mot29")
@@ -0,0 +1,39 @@
+from text_windows import ELISION, compress, sentence_spans, to_original, trim_to_events
+
+TEXT = ("Le préfet a réuni la cellule de crise. Un cas de choléra est confirmé à Mayotte. "
+        "Les écoles restent ouvertes. La météo est clémente. M. Dupont rappelle les consignes. "
+        "Aucun autre cas n'est signalé.")
+
+
+def test_sentence_spans_keep_abbreviations():
+    sentences = [TEXT[s:e] for s, e in sentence_spans(TEXT)]
+    assert sentences[4] == "M. Dupont rappelle les consignes."
+    assert len(sentences) == 6
+
+
+def test_compress_round_trip():
+    positions = [TEXT.index("choléra"), TEXT.index("Dupont")]
+    compressed, mapping = compress(TEXT, positions, context=0)
+    assert compressed.startswith(ELISION)
+    assert compressed.endswith(ELISION)
+    for word in ("choléra", "Mayotte", "Dupont"):
+        offset = to_original(compressed.index(word), mapping)
+        assert TEXT[offset:offset + len(word)] == word
+    # Chaque caractère gardé revient à sa place dans l'original
+    for c_start, o_start, length in mapping:
+        assert compressed[c_start:c_start + length] == TEXT[o_start:o_start + length]
+
+
+def test_to_original_inside_elision():
+    compressed, mapping = compress(TEXT, [TEXT.index("Dupont")], context=0)
+    assert to_original(1, mapping) is None
+
+
+def test_compress_without_reduction_is_identity():
+    assert compress(TEXT, []) == (TEXT, [[0, 0, len(TEXT)]])
+    assert compress(TEXT, [0], context=10) == (TEXT, [[0, 0, len(TEXT)]])
+
+
+def test_trim_to_events_falls_back_to_full_text():
+    assert trim_to_events(TEXT, ["introuvable"]) == TEXT
+    assert "choléra" in trim_to_events(TEXT, ["Choléra"], context=0)